@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+#
+# compare the geometry.geojson conversion with the original
+# shapely mapping + json.dump implementation:
+#
+#   python benchmarks/geometry.py --features 2000 --points 500
+#
+import argparse
+import json
+import math
+import random
+import timeit
+
+import shapely.geometry
+import shapely.wkt
+
+from digital_land_frontend.geometry import HAS_GEOS_GEOJSON, geojson_feature, orjson
+
+
+def mapping_feature(row, field):
+    geojson = {"type": "Feature"}
+    geojson["geometry"] = shapely.geometry.mapping(shapely.wkt.loads(row[field]))
+    geojson["properties"] = row
+    return json.dumps(geojson)
+
+
+def polygon_wkt(points):
+    x, y = random.uniform(-5, 1.5), random.uniform(50, 55)
+    ring = [
+        (
+            x + math.cos(2 * math.pi * n / points) * random.uniform(0.01, 0.02),
+            y + math.sin(2 * math.pi * n / points) * random.uniform(0.01, 0.02),
+        )
+        for n in range(points)
+    ]
+    ring.append(ring[0])
+    return "MULTIPOLYGON (((%s)))" % ", ".join(f"{x} {y}" for x, y in ring)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--features", type=int, default=2000)
+    parser.add_argument("--points", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(1)
+    rows = [
+        {
+            "slug": f"/conservation-area/CA{n}",
+            "conservation-area": f"CA{n}",
+            "name": f"Conservation area {n}",
+            "geometry": polygon_wkt(args.points),
+        }
+        for n in range(args.features)
+    ]
+
+    print(f"shapely {shapely.__version__}, GEOS GeoJSON writer: {HAS_GEOS_GEOJSON}")
+    print(f"orjson: {orjson is not None}")
+    print(f"{args.features} features of {args.points} points")
+
+    results = {}
+    for name, func in [
+        ("mapping", mapping_feature),
+        ("geojson_feature", geojson_feature),
+    ]:
+        seconds = min(
+            timeit.repeat(
+                lambda: [func(row, "geometry") for row in rows],
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        results[name] = seconds
+        print(f"{name:>16}: {seconds:.3f}s {args.features / seconds:,.0f} features/s")
+
+    print(f"{'speedup':>16}: {results['mapping'] / results['geojson_feature']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+#
+# measure Renderer.render on synthetic datasets, with and without
+# geometries, with flat and nested slugs, and with organisation grouping:
+#
+#   python benchmarks/render.py --entities 10000 100000 1000000
+#   python benchmarks/render.py --entities 10000 --save baseline.json
+#   python benchmarks/render.py --entities 10000 --baseline baseline.json
+#
+# each scenario runs in a fresh process so peak memory is its own, and
+# runs offline with templates written to a temporary directory
+#
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from digital_land.model.entity import Entity
+from digital_land.model.entry import Entry
+
+from digital_land_frontend.jinja_filters.mappers import GeneralOrganisationMapper
+from digital_land_frontend.render import Renderer
+
+ROW_TEMPLATE = """<h1>{{ row['name'] }}</h1>
+<ol>{% for crumb in breadcrumb %}<li><a href="{{ crumb.href }}">{{ crumb.text }}</a></li>{% endfor %}</ol>
+<dl>{% for field, value in row.items() %}<dt>{{ field }}</dt><dd>{{ value }}</dd>{% endfor %}</dl>
+"""
+
+INDEX_TEMPLATE = """<h1>{{ count }}</h1>
+{% for group in (groups or {}).values() %}<h2>{{ group.text }}</h2>
+<ul>{% for item in group["items"] %}<li><a href="{{ item.href }}">{{ item.text }}</a></li>{% endfor %}</ul>
+{% endfor %}
+<ul>{% for item in items %}<li><a href="{{ item.href }}">{{ item.text }}</a></li>{% endfor %}</ul>
+"""
+
+ORGANISATIONS = 300
+
+
+def polygon_wkt(x, y, points=32):
+    ring = [
+        (
+            x + math.cos(2 * math.pi * n / points) * 0.01,
+            y + math.sin(2 * math.pi * n / points) * 0.01,
+        )
+        for n in range(points)
+    ]
+    ring.append(ring[0])
+    return "MULTIPOLYGON (((%s)))" % ", ".join(f"{x:.6f} {y:.6f}" for x, y in ring)
+
+
+def load_synthetic_organisations():
+    # group names normally come from the organisation dataset, fetched over
+    # the network the first time they are needed
+    mapper = GeneralOrganisationMapper.organisations
+    mapper.map_data(
+        "organisation,name\n"
+        + "".join(f"org-{n},Organisation {n}\n" for n in range(ORGANISATIONS))
+    )
+    mapper.loaded = True
+
+
+def synthetic_rows(entities, geometry=False, nested=False, seed=1):
+    rng = random.Random(seed)
+    for n in range(entities):
+        reference = f"REF{n}"
+        organisation = f"org-{n % ORGANISATIONS}"
+        if nested:
+            slug = f"/benchmark/{organisation}/area-{n % 7}/{reference}"
+        else:
+            slug = f"/benchmark/{reference}"
+        row = {
+            "benchmark": reference,
+            "name": f"Benchmark item {n}",
+            "slug": slug,
+            "organisation": organisation,
+            "documentation-url": f"https://example.com/{reference}",
+            "start-date": "2021-01-01",
+            "end-date": "",
+            "entry-date": "2021-01-01",
+        }
+        if geometry:
+            row["geometry"] = polygon_wkt(rng.uniform(-5, 1.5), rng.uniform(50, 55))
+        yield row
+
+
+def synthetic_entities(entities, geometry=False, nested=False):
+    for n, row in enumerate(synthetic_rows(entities, geometry, nested)):
+        yield Entity([Entry(row, "resource", n)], "benchmark")
+
+
+def directory_size(path):
+    files = size = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(root, name))
+    return files, size
+
+
+def run_scenario(scenario, directory):
+    directory = Path(directory)
+    (directory / "templates").mkdir(exist_ok=True)
+    (directory / "templates" / "row.html").write_text(ROW_TEMPLATE)
+    (directory / "templates" / "index.html").write_text(INDEX_TEMPLATE)
+    docs = directory / "docs"
+    load_synthetic_organisations()
+
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        renderer = Renderer(
+            "benchmark",
+            "benchmark",
+            "geography",
+            "benchmark",
+            None,
+            None,
+            group_field="organisation" if scenario["grouped"] else None,
+            docs=docs,
+            jobs=scenario.get("jobs"),
+            profile=True,
+            index_store=scenario.get("index_store"),
+        )
+        start = time.perf_counter()
+        renderer.render(
+            synthetic_entities(
+                scenario["entities"], scenario["geometry"], scenario["nested"]
+            )
+        )
+        seconds = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+
+    phases = renderer.profiler.report()["phases"]
+    files, size = directory_size(docs)
+    return dict(
+        scenario,
+        seconds=seconds,
+        entities_per_second=scenario["entities"] / seconds,
+        index_seconds=phases.get("index-pages", {}).get("seconds", 0.0),
+        # the largest of this process and any worker processes, in kilobytes
+        peak_memory_mb=max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+        / 1024,
+        files=files,
+        output_mb=size / 1024 / 1024,
+    )
+
+
+def scenario_name(scenario):
+    return "{entities}{geometry}{nested}{grouped}".format(
+        entities=scenario["entities"],
+        geometry="-geometry" if scenario["geometry"] else "",
+        nested="-nested" if scenario["nested"] else "-flat",
+        grouped="-grouped" if scenario["grouped"] else "",
+    )
+
+
+def run_in_process(scenario):
+    # a fresh interpreter per scenario, so peak memory is not carried over
+    result = subprocess.run(
+        [sys.executable, __file__, "--scenario", json.dumps(scenario)],
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def both(value):
+    return {"yes": [True], "no": [False], "both": [False, True]}[value]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entities", type=int, nargs="+", default=[10000])
+    parser.add_argument("--geometry", choices=["yes", "no", "both"], default="both")
+    parser.add_argument("--nested", choices=["yes", "no", "both"], default="both")
+    parser.add_argument("--grouped", choices=["yes", "no", "both"], default="yes")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument(
+        "--index-store",
+        action="store_true",
+        help="hold the index in a temporary database rather than memory",
+    )
+    parser.add_argument("--save", help="save the results as JSON")
+    parser.add_argument("--baseline", help="compare with results saved earlier")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="fraction slower than the baseline counted as a regression",
+    )
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        with tempfile.TemporaryDirectory() as directory:
+            print(json.dumps(run_scenario(json.loads(args.scenario), directory)))
+        return
+
+    results = {}
+    print(
+        f"{'scenario':<36} {'seconds':>9} {'entities/s':>11} {'index s':>8}"
+        f" {'peak MB':>8} {'files':>9} {'output MB':>10}"
+    )
+    for entities, geometry, nested, grouped in itertools.product(
+        args.entities, both(args.geometry), both(args.nested), both(args.grouped)
+    ):
+        scenario = {
+            "entities": entities,
+            "geometry": geometry,
+            "nested": nested,
+            "grouped": grouped,
+            "jobs": args.jobs,
+            "index_store": args.index_store,
+        }
+        name = scenario_name(scenario)
+        result = results[name] = run_in_process(scenario)
+        print(
+            f"{name:<36} {result['seconds']:>9.2f} {result['entities_per_second']:>11,.0f}"
+            f" {result['index_seconds']:>8.2f} {result['peak_memory_mb']:>8.0f}"
+            f" {result['files']:>9,} {result['output_mb']:>10.1f}"
+        )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = [
+            name
+            for name, result in results.items()
+            if name in baseline
+            and result["entities_per_second"]
+            < baseline[name]["entities_per_second"] * (1 - args.tolerance)
+        ]
+        for name in regressions:
+            print(
+                f"regression in {name}: {results[name]['entities_per_second']:,.0f}"
+                f" entities/s, was {baseline[name]['entities_per_second']:,.0f}"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
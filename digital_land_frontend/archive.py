@@ -0,0 +1,321 @@
+import abc
+import argparse
+import io
+import logging
+import mimetypes
+import os
+import sqlite3
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+def _encode(content):
+    return content.encode("utf-8") if isinstance(content, str) else content
+
+
+class ArchiveWriter(abc.ABC):
+    """
+    Base for writers which put every file into a single archive rather than
+    the filesystem, keyed by its path relative to the docs directory.
+    Writes are serialised, so an archive writer can sit behind a
+    ThreadedWriter. Close the writer, or use it as a context manager, to
+    finish the archive once every renderer writing to it has finished.
+    Closing a writer more than once is harmless.
+    """
+
+    writes_files = False
+    multiprocess = False
+
+    def __init__(self, path, root="docs"):
+        self.path = Path(path) if isinstance(path, (str, os.PathLike)) else path
+        self.root = Path(root)
+        self.lock = threading.Lock()
+
+    def name(self, path):
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def write(self, path, content):
+        name = self.name(path)
+        with self.lock:
+            logging.debug(f"archiving {name}")
+            self.add(name, _encode(content))
+
+    def write_stream(self, path, chunks):
+        self.write(path, b"".join(_encode(chunk) for chunk in chunks))
+
+    @abc.abstractmethod
+    def add(self, name, data):
+        # adds the content of a file to the archive, under its name
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def worker_writer(self):
+        raise ValueError(f"{type(self).__name__} can't be shared between processes")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ZipWriter(ArchiveWriter):
+    def __init__(self, path, root="docs", compression=zipfile.ZIP_DEFLATED):
+        super().__init__(path, root)
+        self.zip = zipfile.ZipFile(self.path, "w", compression=compression)
+
+    def add(self, name, data):
+        self.zip.writestr(name, data)
+
+    def write_stream(self, path, chunks):
+        name = self.name(path)
+        with self.lock, self.zip.open(name, "w", force_zip64=True) as f:
+            logging.debug(f"archiving {name}")
+            for chunk in chunks:
+                f.write(_encode(chunk))
+
+    def close(self):
+        with self.lock:
+            self.zip.close()
+
+
+class TarWriter(ArchiveWriter):
+    """
+    Writes a tar stream, to a file or an open binary file object such as
+    stdout, optionally compressed with "gz", "bz2" or "xz".
+    """
+
+    def __init__(self, path, root="docs", compression=""):
+        super().__init__(path, root)
+        mode = f"w|{compression}"
+        if isinstance(self.path, Path):
+            self.tar = tarfile.open(self.path, mode)
+        else:
+            self.tar = tarfile.open(fileobj=self.path, mode=mode)
+
+    def add(self, name, data, size=None):
+        info = tarfile.TarInfo(name)
+        info.size = len(data) if size is None else size
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        self.tar.addfile(info, io.BytesIO(data) if size is None else data)
+
+    def write_stream(self, path, chunks):
+        # a tar header holds the size of the file, so spool the stream first
+        name = self.name(path)
+        with tempfile.TemporaryFile() as spool:
+            for chunk in chunks:
+                spool.write(_encode(chunk))
+            size = spool.tell()
+            spool.seek(0)
+            with self.lock:
+                logging.debug(f"archiving {name}")
+                self.add(name, spool, size)
+
+    def close(self):
+        with self.lock:
+            self.tar.close()
+
+
+class SQLiteWriter(ArchiveWriter):
+    """
+    Writes files as blobs in a SQLite database. Each worker process writes
+    through its own connection, so SQLite output can be rendered with jobs.
+    """
+
+    multiprocess = True
+    schema = "CREATE TABLE IF NOT EXISTS file (path TEXT PRIMARY KEY, content BLOB)"
+    # number of writes held in a transaction before committing
+    batch_size = 1000
+
+    def __init__(self, path, root="docs"):
+        super().__init__(path, root)
+        self.conn = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+        self.conn.execute(self.schema)
+        self.conn.commit()
+        self.pending = 0
+        self.closed = False
+
+    def add(self, name, data):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO file (path, content) VALUES (?, ?)", (name, data)
+        )
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.conn.commit()
+            self.pending = 0
+
+    def flush(self):
+        with self.lock:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.conn.close()
+        self.closed = True
+
+    def worker_writer(self):
+        return SQLiteWriter(self.path, self.root)
+
+
+class ZipReader:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path)
+
+    def items(self):
+        for info in self.zip.infolist():
+            if not info.is_dir():
+                yield info.filename, self.zip.read(info)
+
+    def read(self, name):
+        try:
+            return self.zip.read(name)
+        except KeyError:
+            return None
+
+    def close(self):
+        self.zip.close()
+
+
+class TarReader:
+    def __init__(self, path):
+        self.path = path
+        self.tar = None
+        # read by the threads of an archive server
+        self.lock = threading.Lock()
+
+    def items(self):
+        # a single sequential pass, which also works for compressed streams
+        with tarfile.open(self.path, "r|*") as tar:
+            for info in tar:
+                if info.isfile():
+                    yield info.name, tar.extractfile(info).read()
+
+    def read(self, name):
+        with self.lock:
+            if self.tar is None:
+                self.tar = tarfile.open(self.path, "r:*")
+            try:
+                return self.tar.extractfile(name).read()
+            except KeyError:
+                return None
+
+    def close(self):
+        if self.tar is not None:
+            self.tar.close()
+
+
+class SQLiteReader:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(
+            f"file:{path}?mode=ro", uri=True, check_same_thread=False
+        )
+
+    def items(self):
+        yield from self.conn.execute("SELECT path, content FROM file ORDER BY path")
+
+    def read(self, name):
+        row = self.conn.execute(
+            "SELECT content FROM file WHERE path = ?", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self.conn.close()
+
+
+def open_archive(path):
+    name = str(path)
+    if name.endswith(".zip"):
+        return ZipReader(path)
+    if tarfile.is_tarfile(name):
+        return TarReader(path)
+    return SQLiteReader(path)
+
+
+def extract(path, directory):
+    archive = open_archive(path)
+    try:
+        for name, data in archive.items():
+            target = Path(directory) / name
+            if Path(directory).resolve() not in target.resolve().parents:
+                raise ValueError(f"{name} is outside of {directory}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(data)
+    finally:
+        archive.close()
+
+
+def archive_handler(archive):
+    class ArchiveHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            name = self.path.split("?")[0].lstrip("/")
+            if name == "" or name.endswith("/"):
+                name += "index.html"
+            data = archive.read(name)
+            if data is None:
+                data = archive.read(f"{name}/index.html")
+                if data is None:
+                    self.send_error(404)
+                    return
+                name = f"{name}/index.html"
+
+            self.send_response(200)
+            self.send_header(
+                "Content-Type",
+                mimetypes.guess_type(name)[0] or "application/octet-stream",
+            )
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return ArchiveHandler
+
+
+def serve(path, host="127.0.0.1", port=8000):
+    archive = open_archive(path)
+    server = ThreadingHTTPServer((host, port), archive_handler(archive))
+    logging.info(f"serving {path} on http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        archive.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="serve or extract a site rendered into an archive"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("archive")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    extract_parser = subparsers.add_parser("extract")
+    extract_parser.add_argument("archive")
+    extract_parser.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "serve":
+        serve(args.archive, args.host, args.port)
+    else:
+        extract(args.archive, args.directory)
+
+
+if __name__ == "__main__":
+    main()
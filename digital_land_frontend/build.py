@@ -0,0 +1,217 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from time import perf_counter
+
+from digital_land_frontend.jinja import setup_jinja
+from digital_land_frontend.jinja_filters.mappers import GeneralOrganisationMapper
+from digital_land_frontend.render import Renderer
+
+# each pipeline is a dict of the Renderer arguments for the pipeline, with
+# the dataset_path of the dataset to render, for example:
+#
+#   {
+#       "pipeline_name": "conservation-area",
+#       "schema": "conservation-area",
+#       "typology": "geography",
+#       "key_field": "conservation-area",
+#       "dataset_path": "dataset/conservation-area.sqlite3",
+#   }
+#
+# with incremental builds, a previous_dataset_path of the dataset last built
+# renders only the entities which have changed since
+#
+# a pipeline can be split across machines, each building one shard of its
+# row pages, followed by a build merging the shards to render its index pages
+
+_shared_env = None
+_renderer_kwargs = {}
+
+
+def pipeline_size(pipeline):
+    try:
+        return os.path.getsize(pipeline["dataset_path"])
+    except OSError:
+        return 0
+
+
+def preload_mappers():
+    # organisation names are used to title the groups of most pipelines
+    for mapper in GeneralOrganisationMapper.mappers:
+        if not mapper.loaded:
+            mapper.load()
+
+
+def parse_shard(value):
+    # a shard given as number/count, such as 2/4
+    try:
+        number, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} isn't a shard such as 1/4")
+    if not 1 <= number <= count:
+        raise argparse.ArgumentTypeError(f"there is no shard {value}")
+    return number, count
+
+
+def build_pipeline(pipeline, docs="docs", merge_shards=None):
+    pipeline = dict(pipeline)
+    dataset_path = pipeline.pop("dataset_path")
+    previous_dataset_path = pipeline.pop("previous_dataset_path", None)
+    kwargs = dict(_renderer_kwargs, **pipeline)
+    kwargs.setdefault("docs", os.path.join(docs, pipeline["pipeline_name"]))
+
+    result = {
+        "pipeline": pipeline["pipeline_name"],
+        "dataset_path": dataset_path,
+        "size": pipeline_size({"dataset_path": dataset_path}),
+    }
+    start = perf_counter()
+    try:
+        renderer = Renderer(jinja_env=_shared_env, **kwargs)
+        if merge_shards:
+            renderer.merge_shards(merge_shards)
+        elif previous_dataset_path:
+            renderer.render_dataset_diff(previous_dataset_path, dataset_path)
+        else:
+            renderer.render_dataset(dataset_path)
+        result["entities"] = len(renderer.slug_seen)
+    except Exception as e:
+        logging.exception(e)
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = perf_counter() - start
+    return result
+
+
+def build(
+    pipelines,
+    jobs=None,
+    view_model=None,
+    specification=None,
+    bytecode_cache=None,
+    preload=True,
+    docs="docs",
+    merge_shards=None,
+    **renderer_kwargs,
+):
+    """
+    Renders each of the pipelines, sharing one Jinja environment and one set
+    of loaded mappers. With jobs, pipelines are built concurrently on a pool
+    of worker processes, largest dataset first so the longest builds don't
+    start last. Each pipeline is rendered into its own directory under docs,
+    unless it sets docs itself. Returns the timings of each pipeline in the
+    order they finish. With merge_shards, the index pages of pipelines
+    built in that many shards are rendered from the index of each shard.
+    """
+    global _shared_env, _renderer_kwargs
+    _shared_env = setup_jinja(view_model, specification, bytecode_cache)
+    _renderer_kwargs = dict(
+        renderer_kwargs, view_model=view_model, specification=specification
+    )
+    if preload:
+        preload_mappers()
+
+    pipelines = sorted(pipelines, key=pipeline_size, reverse=True)
+    results = []
+    if not jobs or jobs <= 1:
+        for pipeline in pipelines:
+            results.append(build_pipeline(pipeline, docs, merge_shards))
+            log_result(results[-1])
+        return results
+
+    # workers inherit the environment, arguments and mappers set up here,
+    # which can't be pickled, so must be forked whatever the platform default
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=multiprocessing.get_context("fork")
+    ) as executor:
+        futures = [
+            executor.submit(build_pipeline, pipeline, docs, merge_shards)
+            for pipeline in pipelines
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+            log_result(results[-1])
+    return results
+
+
+def log_result(result):
+    if "error" in result:
+        logging.error(f"{result['pipeline']} failed: {result['error']}")
+    else:
+        logging.info(
+            f"{result['pipeline']}: {result['entities']} entities"
+            f" in {result['seconds']:.1f}s"
+        )
+
+
+def summary(results):
+    lines = [f"{'pipeline':<40} {'entities':>10} {'seconds':>10}"]
+    for result in sorted(results, key=lambda result: -result["seconds"]):
+        entities = result.get("entities", "failed")
+        lines.append(
+            f"{result['pipeline']:<40} {entities:>10} {result['seconds']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="render many pipelines sharing templates and mappers"
+    )
+    parser.add_argument(
+        "pipelines", help="JSON file with a list of pipelines to render"
+    )
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--docs", default="docs")
+    parser.add_argument("--specification", help="specification directory")
+    parser.add_argument("--bytecode-cache", help="directory to cache templates in")
+    parser.add_argument("--report", help="save the timings as JSON")
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        help="render the row pages of one shard, such as 1/4, of each pipeline",
+    )
+    parser.add_argument(
+        "--merge-shards",
+        type=int,
+        metavar="COUNT",
+        help="render the index pages of pipelines built in COUNT shards",
+    )
+    args = parser.parse_args(argv)
+    if args.shard and args.merge_shards:
+        parser.error("--shard and --merge-shards are separate builds")
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    with open(args.pipelines) as f:
+        pipelines = json.load(f)
+
+    specification = None
+    if args.specification:
+        from digital_land.specification import Specification
+
+        specification = Specification(args.specification)
+
+    results = build(
+        pipelines,
+        jobs=args.jobs,
+        specification=specification,
+        bytecode_cache=args.bytecode_cache,
+        docs=args.docs,
+        merge_shards=args.merge_shards,
+        shard=args.shard,
+    )
+    print(summary(results))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if any("error" in result for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
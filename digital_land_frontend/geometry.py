@@ -0,0 +1,104 @@
+import json
+
+import shapely
+import shapely.geometry
+import shapely.wkt
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# shapely 2 can parse WKT and write GeoJSON text entirely within GEOS
+HAS_GEOS_GEOJSON = hasattr(shapely, "to_geojson")
+
+
+def dumps(value):
+    if orjson:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value)
+
+
+def round_coordinates(coordinates, precision):
+    if isinstance(coordinates, float):
+        return round(coordinates, precision)
+    return [round_coordinates(c, precision) for c in coordinates]
+
+
+def wkt_to_json_geometry(input_, precision=None):
+    shape = shapely.wkt.loads(input_)
+    geometry = shapely.geometry.mapping(shape)
+    if precision is not None:
+        geometry = dict(
+            geometry,
+            coordinates=round_coordinates(geometry["coordinates"], precision),
+        )
+    return geometry
+
+
+def wkt_to_geometry(input_, precision=None):
+    if not HAS_GEOS_GEOJSON:
+        # coordinates are rounded when the geometry is written
+        return shapely.wkt.loads(input_)
+
+    geometry = shapely.from_wkt(input_)
+    if precision is not None:
+        geometry = shapely.transform(
+            geometry, lambda coordinates: coordinates.round(precision)
+        )
+    return geometry
+
+
+def geometry_to_geojson(geometry, precision=None):
+    if HAS_GEOS_GEOJSON:
+        return shapely.to_geojson(geometry)
+
+    geojson = shapely.geometry.mapping(geometry)
+    if precision is not None:
+        geojson = dict(
+            geojson, coordinates=round_coordinates(geojson["coordinates"], precision)
+        )
+    return dumps(geojson)
+
+
+def wkt_to_geojson(input_, precision=None):
+    return geometry_to_geojson(wkt_to_geometry(input_, precision), precision)
+
+
+def wkts_to_geojson(inputs, precision=None):
+    # converts a WKT string, or an array of them in one vectorised call
+    if not HAS_GEOS_GEOJSON:
+        return [dumps(wkt_to_json_geometry(input_, precision)) for input_ in inputs]
+
+    geometries = shapely.from_wkt(inputs)
+    if precision is not None:
+        geometries = shapely.transform(
+            geometries, lambda coordinates: coordinates.round(precision)
+        )
+    geojson = shapely.to_geojson(geometries)
+    return geojson.tolist() if hasattr(geojson, "tolist") else geojson
+
+
+def feature_properties(row, properties=None, exclude=()):
+    if properties is not None:
+        row = {field: row[field] for field in properties if field in row}
+    if exclude:
+        row = {field: value for field, value in row.items() if field not in exclude}
+    return row
+
+
+def feature(geometry, properties):
+    # the geometry text is spliced in rather than being parsed into, and
+    # serialised back out of, a tree of Python lists
+    return '{"type": "Feature", "geometry": %s, "properties": %s}' % (
+        geometry,
+        dumps(properties),
+    )
+
+
+def geojson_feature(
+    row, field, precision=None, properties=None, exclude=(), geometry=None
+):
+    if geometry is None:
+        geometry = wkt_to_geojson(row[field], precision)
+    return feature(geometry, feature_properties(row, properties, exclude))
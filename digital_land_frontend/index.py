@@ -0,0 +1,205 @@
+import logging
+import re
+from operator import attrgetter
+
+re_digits = re.compile("([0-9]+)")
+
+
+def natural_sort_key(text):
+    # digits compare as numbers, so REF2 sorts before REF10
+    return tuple(
+        int(part) if part.isdigit() else part for part in re_digits.split(text)
+    )
+
+
+class IndexEntry:
+    # one of these is held for every item on every index page until the
+    # index pages are rendered, so keep them small
+    __slots__ = ("reference", "text", "href", "slug", "end_date")
+
+    def __init__(self, reference, text, href=None, slug=None, end_date=""):
+        if not href and not slug:
+            raise ValueError("index entry requires href or slug")
+        self.reference = reference
+        self.text = text
+        self.href = href
+        self.slug = slug
+        self.end_date = end_date
+
+    @property
+    def sort_key(self):
+        return natural_sort_key(self.reference)
+
+    def state(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def to_dict(self, relative_to=None, base="./"):
+        href = rebase_href(
+            self.href or slug_to_relative_href(self.slug, relative_to), base
+        )
+        return {
+            "reference": self.reference,
+            "text": self.text,
+            "href": href,
+            "end-date": self.end_date,
+        }
+
+
+class IndexItems:
+    """
+    Index entries kept in the natural order of their references. Entries are
+    appended as they arrive and sorted at most once, when the items are read,
+    keeping the order entries were added in for equal references. Sort keys
+    are computed once per entry by the sort rather than held on every entry.
+    """
+
+    __slots__ = ("entries", "ordered", "last_key")
+
+    def __init__(self, entries=()):
+        self.entries = []
+        self.ordered = True
+        self.last_key = None
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        if self.ordered:
+            key = entry.sort_key
+            if self.entries and key < self.last_key:
+                self.ordered = False
+            self.last_key = key
+        self.entries.append(entry)
+
+    def remove(self, slugs):
+        # removes the entries for any of the slugs, keeping the order of the rest
+        self.entries = [entry for entry in self.entries if entry.slug not in slugs]
+        if self.entries and self.ordered:
+            self.last_key = self.entries[-1].sort_key
+
+    def __iter__(self):
+        if not self.ordered:
+            self.entries.sort(key=attrgetter("sort_key"))
+            self.ordered = True
+            self.last_key = self.entries[-1].sort_key
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SlugTrie:
+    """
+    The index pages below the root of a dataset, as a trie of the paths of
+    slugs. Each node holds the entries added to its page, keyed by reference,
+    and a node for each directory below it. Directories are listed on the
+    page of their parent when the page is read, rather than stored as entries.
+    """
+
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = {}
+
+    def add(self, path, reference, entry):
+        # path is the slug below the dataset, such as organisation/reference
+        parts = path.split("/")
+        node = self
+        for part in parts[:-1]:
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = SlugTrie()
+            node = child
+        if reference in node.entries:
+            return False
+        node.entries[reference] = entry
+        return True
+
+    def remove(self, path, reference):
+        # removes an entry, and the pages left without entries or directories
+        nodes = [self]
+        for part in path.split("/")[:-1]:
+            node = nodes[-1].children.get(part)
+            if node is None:
+                return False
+            nodes.append(node)
+        if nodes[-1].entries.pop(reference, None) is None:
+            return False
+
+        parts = path.split("/")[:-1]
+        while len(nodes) > 1 and not nodes[-1].entries and not nodes[-1].children:
+            nodes.pop()
+            del nodes[-1].children[parts[len(nodes) - 1]]
+        return True
+
+    def find(self, path):
+        # the node of the page at path, or None
+        node = self
+        for part in path.split("/") if path else []:
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def walk(self, path=""):
+        # yields the path and node of every page below this one
+        for part, child in self.children.items():
+            child_path = f"{path}/{part}" if path else part
+            yield child_path, child
+            yield from child.walk(child_path)
+
+    def items(self, extra=()):
+        # the entries of the page in natural order, with extra entries
+        items = IndexItems(self.entries.values())
+        for entry in extra:
+            items.append(entry)
+        return items
+
+    def directories(self):
+        # directories without an entry of the same reference
+        return [part for part in self.children if part not in self.entries]
+
+    def __len__(self):
+        return len(self.entries) + len(self.directories())
+
+    def state(self):
+        return {
+            "entries": [entry.state() for entry in self.entries.values()],
+            "children": {part: child.state() for part, child in self.children.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        node = cls()
+        for values in state["entries"]:
+            entry = IndexEntry(*values)
+            node.entries[entry.reference] = entry
+        for part, child in state["children"].items():
+            node.children[part] = cls.from_state(child)
+        return node
+
+
+def slug_to_relative_href(slug, strip_prefix=None):
+    logging.debug(">> slug_to_relative_href(%s, %s)", slug, strip_prefix)
+    if slug.startswith("/"):
+        slug = slug[1:]
+
+    if strip_prefix and slug.startswith(strip_prefix):
+        slug = slug[len(strip_prefix) :]
+        if slug.startswith("/"):
+            slug = slug[1:]
+
+    logging.debug("<< " + str(strip_prefix) + "   ./" + slug)
+    return "./" + slug
+
+
+def rebase_href(href, base):
+    # an href relative to the first page of an index, from the page of the
+    # index at base, such as ../../ for the pages after the first
+    if base == "./" or not href:
+        return href
+    if href.startswith("./"):
+        return base + href[2:]
+    if href.startswith("../"):
+        return base + href
+    return href
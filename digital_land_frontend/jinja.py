@@ -1,9 +1,88 @@
+import hashlib
+import os
+import tempfile
+
 import jinja2
+from jinja2.bccache import Bucket, BytecodeCache
 
 from .filters import register_basic_filters, register_mapper_filters
 
 
-def setup_jinja(view_model=None, specification=None):
+def compile_options(env):
+    # environment settings which change the code a template compiles to
+    return (
+        jinja2.__version__,
+        env.block_start_string,
+        env.block_end_string,
+        env.variable_start_string,
+        env.variable_end_string,
+        env.comment_start_string,
+        env.comment_end_string,
+        env.line_statement_prefix,
+        env.line_comment_prefix,
+        env.trim_blocks,
+        env.lstrip_blocks,
+        env.newline_sequence,
+        env.keep_trailing_newline,
+        env.optimized,
+        repr(env.autoescape),
+        tuple(sorted(env.extensions)),
+    )
+
+
+class TemplateCodeCache(BytecodeCache):
+    """
+    Compiled template code, shared by every environment using the cache and
+    optionally persisted to a directory. Code is keyed by a hash of the
+    template name, its source, and the environment options it was compiled
+    with, so edited templates are recompiled.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.codes = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get_bucket(self, environment, name, filename, source):
+        key = hashlib.sha1(
+            repr((name, source, compile_options(environment))).encode("utf-8")
+        ).hexdigest()
+        bucket = Bucket(environment, key, key)
+        self.load_bytecode(bucket)
+        return bucket
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.cache")
+
+    def load_bytecode(self, bucket):
+        if bucket.key in self.codes:
+            bucket.code = self.codes[bucket.key]
+            return
+        if self.directory and os.path.exists(self.path(bucket.key)):
+            with open(self.path(bucket.key), "rb") as f:
+                bucket.load_bytecode(f)
+            if bucket.code is not None:
+                self.codes[bucket.key] = bucket.code
+
+    def dump_bytecode(self, bucket):
+        self.codes[bucket.key] = bucket.code
+        if self.directory:
+            # written then renamed, so concurrent builds never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, "wb") as f:
+                bucket.write_bytecode(f)
+            os.replace(tmp_path, self.path(bucket.key))
+
+    def clear(self):
+        self.codes = {}
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".cache"):
+                    os.unlink(os.path.join(self.directory, name))
+
+
+def setup_jinja(view_model=None, specification=None, bytecode_cache=None):
     # register templates
     multi_loader = jinja2.ChoiceLoader(
         [
@@ -20,7 +99,18 @@ def setup_jinja(view_model=None, specification=None):
             ),
         ]
     )
-    env = jinja2.Environment(loader=multi_loader, autoescape=True)
+
+    # bytecode_cache is a directory to keep compiled templates in, or a cache,
+    # otherwise compiled templates are kept in memory, as each renderer
+    # sharing the environment keeps a template cache of its own
+    if bytecode_cache is None:
+        bytecode_cache = TemplateCodeCache()
+    elif not isinstance(bytecode_cache, BytecodeCache):
+        bytecode_cache = TemplateCodeCache(bytecode_cache)
+
+    env = jinja2.Environment(
+        loader=multi_loader, autoescape=True, bytecode_cache=bytecode_cache
+    )
 
     # register jinja filters
     register_basic_filters(env, specification)
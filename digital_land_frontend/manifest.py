@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from digital_land_frontend.writers import COMPRESSED_SUFFIXES, COMPRESSORS
+
+
+def content_hash(content):
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha1(content).hexdigest()
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+class BuildManifest:
+    """
+    Records a hash of the inputs and the content of every file written under
+    the docs directory, so a later build can skip rendering or writing pages
+    which haven't changed, and remove pages which are no longer produced.
+    """
+
+    filename = ".render-manifest.json"
+
+    def __init__(self, docs, name=None, compress=()):
+        # builds writing to the same docs keep manifests of different names
+        self.docs = Path(docs)
+        self.path = self.docs / (
+            self.filename.replace(".json", f"-{name}.json") if name else self.filename
+        )
+        # suffixes of the compressed copies written beside every output
+        self.suffixes = tuple(COMPRESSORS[format].suffix for format in compress)
+        self.previous = {"inputs": {}, "outputs": {}}
+        self.current = {"inputs": {}, "outputs": {}}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.previous = json.load(f)
+
+    def key(self, path):
+        return os.path.relpath(path, self.docs)
+
+    def variants(self, path):
+        # an output and its compressed copies, each recorded as an output,
+        # with none for an output which is already compressed
+        if str(path).endswith(COMPRESSED_SUFFIXES):
+            return [path]
+        return [f"{path}{suffix}" for suffix in ("",) + self.suffixes]
+
+    @staticmethod
+    def hash_input(*values):
+        return content_hash(json.dumps(values, default=_json_default))
+
+    def unchanged(self, path, input_hash, dependants=()):
+        key = self.key(path)
+        self.current["inputs"][key] = input_hash
+        if self.previous["inputs"].get(key) != input_hash:
+            return False
+        for variant in self.variants(path):
+            if self.key(variant) not in self.previous["outputs"] or not (
+                os.path.exists(variant)
+            ):
+                return False
+        # dependants aren't always produced, but must exist if they were
+        for output in dependants:
+            for variant in self.variants(output):
+                if self.key(variant) in self.previous["outputs"] and not (
+                    os.path.exists(variant)
+                ):
+                    return False
+
+        # carry forward the outputs produced from the same input last time
+        for output in [path] + list(dependants):
+            for variant in map(self.key, self.variants(output)):
+                if variant in self.previous["outputs"]:
+                    self.current["outputs"][variant] = self.previous["outputs"][variant]
+        return True
+
+    def changed(self, path, content):
+        return self.output_changed(path, content_hash(content))
+
+    def output_changed(self, path, output_hash):
+        # the compressed copies are compressed from the same content
+        changed = False
+        for variant in self.variants(path):
+            key = self.key(variant)
+            self.current["outputs"][key] = output_hash
+            if self.previous["outputs"].get(key) != output_hash:
+                changed = True
+            elif not os.path.exists(variant):
+                changed = True
+        return changed
+
+    def carry_forward(self):
+        # keep every output of the previous build, for builds which only
+        # render what changed
+        self.current = {
+            "inputs": dict(self.previous["inputs"]),
+            "outputs": dict(self.previous["outputs"]),
+        }
+
+    def forget(self, path):
+        # an output carried forward which is no longer produced, and so stale
+        self.current["inputs"].pop(self.key(path), None)
+        forgotten = [
+            self.current["outputs"].pop(self.key(variant), None)
+            for variant in self.variants(path)
+        ]
+        return forgotten[0] is not None
+
+    def drain(self):
+        state, self.current = self.current, {"inputs": {}, "outputs": {}}
+        return state
+
+    def update(self, state):
+        self.current["inputs"].update(state["inputs"])
+        self.current["outputs"].update(state["outputs"])
+
+    def stale_paths(self):
+        for key in self.previous["outputs"]:
+            if key not in self.current["outputs"]:
+                yield self.docs / key
+
+    def remove_stale(self):
+        for path in self.stale_paths():
+            logging.debug("removing %s", path)
+            for variant in [path] + [
+                path.with_name(path.name + suffix) for suffix in COMPRESSED_SUFFIXES
+            ]:
+                if variant.exists():
+                    variant.unlink()
+
+            # prune directories left empty, stopping at the docs directory
+            parent = path.parent
+            while parent != self.docs and parent.exists() and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+
+    def save(self):
+        self.docs.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.current, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,110 @@
+import heapq
+import json
+from contextlib import nullcontext
+from time import perf_counter
+
+
+class Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, perf_counter() - self.start)
+
+
+class Profiler:
+    """
+    Accumulates the wall time and number of calls of each phase of a render,
+    and the slowest pages. Phases timed in worker processes are summed, so
+    can add up to more than the elapsed time of the run.
+    """
+
+    def __init__(self, slowest=10):
+        self.slowest = slowest
+        # phase name: [calls, seconds]
+        self.phases = {}
+        # min-heap of (seconds, path) holding the slowest pages
+        self.pages = []
+
+    def phase(self, name):
+        return Phase(self, name)
+
+    def add(self, name, seconds, calls=1):
+        totals = self.phases.setdefault(name, [0, 0.0])
+        totals[0] += calls
+        totals[1] += seconds
+
+    def page(self, path, seconds):
+        if len(self.pages) < self.slowest:
+            heapq.heappush(self.pages, (seconds, path))
+        elif seconds > self.pages[0][0]:
+            heapq.heapreplace(self.pages, (seconds, path))
+
+    def drain(self):
+        state = {"phases": self.phases, "pages": self.pages}
+        self.phases, self.pages = {}, []
+        return state
+
+    def update(self, state):
+        for name, (calls, seconds) in state["phases"].items():
+            self.add(name, seconds, calls)
+        for seconds, path in state["pages"]:
+            self.page(path, seconds)
+
+    def report(self):
+        return {
+            "phases": {
+                name: {"calls": calls, "seconds": seconds}
+                for name, (calls, seconds) in sorted(
+                    self.phases.items(), key=lambda item: -item[1][1]
+                )
+            },
+            "slowest": [
+                {"path": path, "seconds": seconds}
+                for seconds, path in sorted(self.pages, reverse=True)
+            ],
+        }
+
+    def summary(self):
+        report = self.report()
+        lines = ["phase                     calls      seconds"]
+        for name, phase in report["phases"].items():
+            lines.append(f"{name:<20} {phase['calls']:>10} {phase['seconds']:>12.3f}")
+        if report["slowest"]:
+            lines.append("slowest pages:")
+            for page in report["slowest"]:
+                lines.append(f"{page['seconds']:>10.3f}  {page['path']}")
+        return "\n".join(lines)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+
+class NullProfiler:
+    # used when profiling is off, so timing a phase costs a method call
+    _phase = nullcontext()
+
+    def phase(self, name):
+        return self._phase
+
+    def add(self, name, seconds, calls=1):
+        pass
+
+    def page(self, path, seconds):
+        pass
+
+    def drain(self):
+        return None
+
+    def update(self, state):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
@@ -0,0 +1,183 @@
+import csv
+import json
+import zlib
+from itertools import groupby, islice
+from operator import itemgetter
+from pathlib import Path
+
+from digital_land.model.entity import Entity
+from digital_land.model.entry import Entry
+from digital_land.repository.entry_repository import EntryRepository
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# a single scan of the EntryRepository entry table, listing the entries of
+# each slug in the order they were added, as find_by_slug does, since
+# Entity.snapshot resolves entries of the same date by their order
+ENTRIES_QUERY = "SELECT slug, data, resource, line_num FROM entry ORDER BY slug, rowid"
+
+
+def _fetch_batches(cursor, batch_size):
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            return
+        yield from batch
+
+
+def read_entry_rows(dataset_path, batch_size=10000):
+    # yields each slug with its entries as undecoded (data, resource, line_num) rows
+    conn = EntryRepository(dataset_path).conn
+    try:
+        rows = _fetch_batches(conn.execute(ENTRIES_QUERY), batch_size)
+        for slug, group in groupby(rows, key=itemgetter(0)):
+            yield slug, [row[1:] for row in group]
+    finally:
+        conn.close()
+
+
+def _entries(rows):
+    return [
+        Entry(json.loads(data), resource, line_num) for data, resource, line_num in rows
+    ]
+
+
+def read_entries(dataset_path, batch_size=10000):
+    for slug, rows in read_entry_rows(dataset_path, batch_size):
+        yield slug, _entries(rows)
+
+
+def in_shard(slug, shard):
+    # shard is the number, from 1, and count of the shards of a build
+    number, count = shard
+    return zlib.crc32(slug.encode("utf-8")) % count == number - 1
+
+
+def read_entities(dataset_path, schema, batch_size=10000, start=0, shard=None):
+    # entities of other shards and the first start entities are skipped
+    # without being decoded
+    rows = read_entry_rows(dataset_path, batch_size)
+    if shard:
+        rows = (row for row in rows if row[0] and in_shard(row[0], shard))
+    for slug, entry_rows in islice(rows, start, None):
+        yield Entity(_entries(entry_rows), schema)
+
+
+def diff_entries(previous_path, dataset_path, batch_size=10000):
+    """
+    Yields the slug, previous entry rows and entry rows of each slug whose
+    entries differ between two datasets, with None for a slug missing from
+    one of them. Both datasets are read in slug order and merged, so only
+    the entries of changed slugs are decoded.
+    """
+    previous = read_entry_rows(previous_path, batch_size)
+    current = read_entry_rows(dataset_path, batch_size)
+    old = next(previous, None)
+    new = next(current, None)
+    while old or new:
+        # SQLite orders text as UTF-8 bytes, the same order as Python strings
+        if new is None or (old is not None and (old[0] or "") < (new[0] or "")):
+            yield old[0], old[1], None
+            old = next(previous, None)
+        elif old is None or (new[0] or "") < (old[0] or ""):
+            yield new[0], None, new[1]
+            new = next(current, None)
+        else:
+            if old[1] != new[1]:
+                yield new[0], old[1], new[1]
+            old = next(previous, None)
+            new = next(current, None)
+
+
+def diff_entities(previous_path, dataset_path, schema, batch_size=10000):
+    # yields the previous entity and the entity for each changed slug
+    for slug, old, new in diff_entries(previous_path, dataset_path, batch_size):
+        yield (
+            Entity(_entries(old), schema) if old else None,
+            Entity(_entries(new), schema) if new else None,
+        )
+
+
+class DatasetRow:
+    """
+    A row of a flattened dataset, such as the dataset CSV, read in place of
+    an Entity. Its snapshot is the row, so rows go straight to the render
+    loop without building entries, and it has no history of entries.
+    """
+
+    __slots__ = ("row",)
+
+    def __init__(self, row):
+        self.row = row
+
+    def snapshot(self):
+        return dict(self.row)
+
+    def all_fields(self):
+        return list(self.row)
+
+    def change_history(self):
+        return []
+
+
+# suffixes of the flattened dataset files read_rows can read
+ROW_FORMATS = (".csv", ".parquet", ".arrow", ".feather")
+
+
+def _read_csv(path, batch_size):
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def _read_batches(batches):
+    # values are strings, as they are in the dataset CSV
+    for batch in batches:
+        for row in batch.to_pylist():
+            yield {
+                field: "" if value is None else str(value)
+                for field, value in row.items()
+            }
+
+
+def _read_parquet(path, batch_size):
+    yield from _read_batches(
+        pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=batch_size)
+    )
+
+
+def _read_arrow(path, batch_size):
+    with pyarrow.memory_map(str(path)) as source:
+        reader = pyarrow.ipc.open_file(source)
+        yield from _read_batches(
+            reader.get_batch(n) for n in range(reader.num_record_batches)
+        )
+
+
+def read_rows(path, batch_size=10000, start=0, shard=None):
+    """
+    Yields a DatasetRow for each row of a CSV, Parquet or Arrow file of a
+    flattened dataset, which must have a slug field. Parquet and Arrow files
+    are read a record batch at a time, and need pyarrow.
+    """
+    suffix = Path(path).suffix
+    if suffix not in ROW_FORMATS:
+        raise ValueError(f"can't read rows from a {suffix} file")
+    if suffix != ".csv" and not pyarrow:
+        raise ValueError(f"reading {suffix} files requires the pyarrow package")
+
+    read = {
+        ".csv": _read_csv,
+        ".parquet": _read_parquet,
+        ".arrow": _read_arrow,
+        ".feather": _read_arrow,
+    }[suffix]
+    rows = read(path, batch_size)
+    if shard:
+        rows = (row for row in rows if row["slug"] and in_shard(row["slug"], shard))
+    for row in islice(rows, start, None):
+        yield DatasetRow(row)
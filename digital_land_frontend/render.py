@@ -1,19 +1,59 @@
+import hashlib
 import json
 import logging
+import math
+import multiprocessing
+import os
+import posixpath
 import re
-from collections import OrderedDict, defaultdict
+import tempfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from operator import attrgetter
 from pathlib import Path
-
-import shapely.wkt
-from digital_land.model.entity import Entity
-from digital_land.repository.entry_repository import EntryRepository
-
+from time import perf_counter
+
+from digital_land_frontend.geometry import (  # noqa: F401
+    feature,
+    feature_properties,
+    geojson_feature,
+    geometry_to_geojson,
+    wkt_to_geometry,
+    wkt_to_json_geometry,
+)
+from digital_land_frontend.index import (  # noqa: F401
+    IndexEntry,
+    IndexItems,
+    SlugTrie,
+    natural_sort_key,
+    rebase_href,
+    slug_to_relative_href,
+)
 from digital_land_frontend.jinja import setup_jinja
 from digital_land_frontend.jinja_filters.mappers import GeneralOrganisationMapper
+from digital_land_frontend.manifest import BuildManifest, content_hash
+from digital_land_frontend.profiling import NULL_PROFILER, Profiler
+from digital_land_frontend.readers import (
+    ROW_FORMATS,
+    diff_entities,
+    in_shard,
+    read_entities,
+    read_rows,
+)
+from digital_land_frontend.search import SearchIndex
+from digital_land_frontend.sitemap import Sitemap
+from digital_land_frontend.spatial import SpatialBundle
+from digital_land_frontend.store import IndexStore
+from digital_land_frontend.writers import (
+    CompressingWriter,
+    FileWriter,
+    ThreadedWriter,
+    default_compress_formats,
+)
 
 # TODO:
 #   - add group_field to specification
-#   - remove `references` from render parameters - use "seen" sets
 #   - clean up template logic now that we always provide href, text and reference
 
 
@@ -32,43 +72,124 @@ def generate_download_link(pipeline_name):
 
 
 class JinjaRenderer:
-    def __init__(self, url_root, view_model, specification, docs="docs"):
+    # number of template output fragments joined into each chunk when streaming
+    stream_buffer_size = 64
+    # size of a streamed page held in memory before spooling to disk
+    spool_max_size = 1024 * 1024
+    # templates hold the globals they were loaded with, so each renderer keeps
+    # a template cache of its own, even when sharing an environment
+    template_cache_size = 400
+
+    def __init__(
+        self,
+        url_root,
+        view_model,
+        specification,
+        docs="docs",
+        manifest=None,
+        writer=None,
+        stream=False,
+        profiler=None,
+        env=None,
+        bytecode_cache=None,
+    ):
         self.docs = docs
-        self.env = setup_jinja(view_model, specification)
-        self.env.globals["enable_x_ref"] = None
-        self.env.globals["urlRoot"] = url_root
-        self.env.trim_blocks = True
-        self.env.lstrip_blocks = True
+        self.manifest = manifest
+        self.writer = writer or FileWriter()
+        self.stream = stream
+        self.profiler = profiler or NULL_PROFILER
+        if env is None:
+            env = setup_jinja(view_model, specification, bytecode_cache)
+
+        # an overlay keeps the settings of this renderer out of a shared environment
+        self.env = env.overlay(
+            trim_blocks=True,
+            lstrip_blocks=True,
+            cache_size=self.template_cache_size,
+        )
+        self.env.globals = dict(env.globals, enable_x_ref=None, urlRoot=url_root)
         self.template = {
             "index": self.env.get_template("index.html"),
             "row": self.env.get_template("row.html"),
         }
 
+    @property
+    def template_version(self):
+        # changes whenever any of the templates available to the pages change
+        if not hasattr(self, "_template_version"):
+            try:
+                names = sorted(self.env.list_templates())
+            except TypeError:
+                names = ["index.html", "row.html"]
+            sources = [self.env.loader.get_source(self.env, name)[0] for name in names]
+            self._template_version = content_hash("\0".join(sources))
+        return self._template_version
+
     def render_index(self, path, *args, **kwargs):
-        JinjaRenderer._render(
+        self._render(
             path,
             self.template["index"],
             **kwargs,
         )
 
     def render_row(self, path, **kwargs):
-        JinjaRenderer._render(
+        self._render(
             path,
             self.template["row"],
             **kwargs,
         )
 
-    @staticmethod
-    def _render(path, template, **kwargs):
-        with open(path, "w") as f:
+    def _render(self, path, template, **kwargs):
+        if self.stream:
+            with self.profiler.phase("template-stream"):
+                return self._render_stream(path, template, **kwargs)
+
+        with self.profiler.phase("template"):
+            content = template.render(**kwargs)
+        if self.manifest and not self.manifest.changed(path, content):
+            logging.debug(f"unchanged {path}")
+            return
+
+        logging.debug(f"creating {path}")
+        with self.profiler.phase("write"):
+            self.writer.write(path, content)
+
+    def _render_stream(self, path, template, **kwargs):
+        stream = template.stream(**kwargs)
+        stream.enable_buffering(self.stream_buffer_size)
+        if not self.manifest:
             logging.debug(f"creating {path}")
-            f.write(template.render(**kwargs))
+            self.writer.write_stream(path, stream)
+            return
+
+        # spool the page so an unchanged page can be skipped before it is written
+        with tempfile.SpooledTemporaryFile(self.spool_max_size, mode="w+") as spool:
+            output_hash = hashlib.sha1()
+            for chunk in stream:
+                spool.write(chunk)
+                output_hash.update(chunk.encode("utf-8"))
+
+            if not self.manifest.output_changed(path, output_hash.hexdigest()):
+                logging.debug(f"unchanged {path}")
+                return
+
+            logging.debug(f"creating {path}")
+            spool.seek(0)
+            self.writer.write_stream(path, iter(lambda: spool.read(65536), ""))
 
 
 class Renderer:
     organisation_mapper = GeneralOrganisationMapper()
     translations = str.maketrans({"/": "-", " ": "", "(": "", ")": "", "'": ""})
     geometry_fields = ["geometry", "point"]
+    # number of entities handed to a worker process at a time when rendering with jobs
+    job_chunksize = 16
+    # the index state of an incremental build, saved alongside its manifest
+    state_filename = ".render-state.json"
+    # the state of an unfinished render, saved every checkpoint_interval seconds
+    checkpoint_filename = ".render-checkpoint.json"
+    # the index of each shard of a sharded build, merged to render the index pages
+    shard_state_filename = ".render-shard-{}-of-{}.json"
 
     def __init__(
         self,
@@ -84,6 +205,26 @@ class Renderer:
         docs="docs",
         renderer=None,
         limit=None,
+        jobs=None,
+        incremental=False,
+        writer=None,
+        stream=False,
+        geometry_precision=None,
+        geometry_properties=None,
+        geometry_drop_wkt=False,
+        spatial_bundle=False,
+        compress=None,
+        profile=False,
+        jinja_env=None,
+        bytecode_cache=None,
+        index_page_size=None,
+        search_index=False,
+        sitemap_url=None,
+        sitemap_gzip=False,
+        checkpoint_interval=None,
+        resume=False,
+        index_store=None,
+        shard=None,
     ):
         self.pipeline_name = pipeline_name
         self.schema = schema
@@ -92,41 +233,165 @@ class Renderer:
         self.key_field = key_field
         self.group_field = group_field
         self.group_list_field = group_list_field
-        self.index = defaultdict(lambda: {"count": 0, "references": set(), "items": []})
+        # index_store is the path of a database to hold the index in rather
+        # than memory, or True for a temporary one
+        self.store = None
+        if index_store:
+            self.store = IndexStore(None if index_store is True else index_store)
+        self.index = self.store.trie() if self.store else SlugTrie()
+        self.root_index = None
         self.group_map = {}
-        self.group_slug_seen = set()
-        self.slug_seen = set()
+        self.group_slug_seen = self.new_set("group_slug_seen")
+        self.slug_seen = self.new_set("slug_seen")
         self.limit = limit
+        self.jobs = jobs
+        # maximum number of items on each index page, or None for a single page
+        self.index_page_size = index_page_size
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        # shard is the number, from 1, and count of the shards of a build split
+        # across machines, with this renderer rendering the row pages of one
+        self.shard = tuple(shard) if shard else None
+        if self.shard:
+            if not 1 <= self.shard[0] <= self.shard[1]:
+                raise ValueError(f"no shard {self.shard[0]} of {self.shard[1]}")
+            if spatial_bundle or search_index or sitemap_url:
+                raise ValueError(
+                    "spatial bundles, search indexes and sitemaps can't be sharded"
+                )
+        # formats of the compressed copies written beside every file
+        self.compress = (
+            default_compress_formats() if compress is True else list(compress or [])
+        )
+        # profile is True, or a path to save the JSON report to
+        self.profile = profile
+        self.profiler = Profiler() if profile else NULL_PROFILER
+        self.writer = writer or FileWriter()
+        # an archive holds files by their path relative to its root, which
+        # must hold the docs, as a root may be shared by many renderers
+        root = getattr(self.writer, "root", None)
+        if root is not None and os.path.relpath(self.docs, root).startswith(".."):
+            raise ValueError(f"docs {self.docs} are outside the archive root {root}")
+        # workers wrap a writer of their own in the same way
+        worker_writer = self.writer
+        if self.compress:
+            # compress on a pool of threads, away from the render loop
+            self.writer = ThreadedWriter(CompressingWriter(self.writer, self.compress))
+        self.manifest = (
+            BuildManifest(
+                self.docs,
+                "shard-%d-of-%d" % self.shard if shard else None,
+                self.compress,
+            )
+            if incremental
+            else None
+        )
+        if incremental and not self.writer.writes_files:
+            raise ValueError("incremental rendering requires output to files")
+        if (checkpoint_interval or resume) and spatial_bundle:
+            raise ValueError("spatial bundles can't be resumed from a checkpoint")
+        if (checkpoint_interval or resume) and self.store and self.store.temporary:
+            raise ValueError(
+                "a temporary index store can't be resumed from a checkpoint"
+            )
+        if jobs and jobs > 1 and not self.writer.multiprocess:
+            raise ValueError(
+                f"{type(self.writer).__name__} can't be used with multiple jobs"
+            )
+
+        # options for the geometry.geojson written alongside each row page
+        self.geometry_options = {
+            "precision": geometry_precision,
+            "properties": geometry_properties,
+            "exclude": self.geometry_fields if geometry_drop_wkt else (),
+        }
+
+        self.spatial_bundle = (
+            SpatialBundle(self.docs, self.translations) if spatial_bundle else None
+        )
+        # built from the rows handed back to this process, so never in workers
+        self.search_index = SearchIndex(self.docs) if search_index else None
 
         if not url_root:
             url_root = f"/{pipeline_name.replace(' ', '-')}/"
+        self.url_root = url_root
+
+        # sitemap_url is the site the pages are published on
+        self.sitemap = (
+            Sitemap(self.docs, sitemap_url, url_root, sitemap_gzip)
+            if sitemap_url
+            else None
+        )
+
+        # arguments used to build an equivalent Renderer in each worker process
+        self.worker_kwargs = {
+            "pipeline_name": pipeline_name,
+            "schema": schema,
+            "typology": typology,
+            "key_field": key_field,
+            "view_model": view_model,
+            "specification": specification,
+            "url_root": url_root,
+            "group_field": group_field,
+            "group_list_field": group_list_field,
+            "docs": docs,
+            "renderer": renderer,
+            "incremental": incremental,
+            "writer": worker_writer,
+            "stream": stream,
+            "geometry_precision": geometry_precision,
+            "geometry_properties": geometry_properties,
+            "geometry_drop_wkt": geometry_drop_wkt,
+            "spatial_bundle": spatial_bundle,
+            "compress": self.compress,
+            "profile": profile,
+            "jinja_env": jinja_env,
+            "bytecode_cache": bytecode_cache,
+            "shard": shard,
+        }
 
         self.renderer = renderer or JinjaRenderer(
-            url_root, view_model, specification, docs
+            url_root,
+            view_model,
+            specification,
+            docs,
+            manifest=self.manifest,
+            writer=self.writer,
+            stream=stream,
+            profiler=self.profiler,
+            env=jinja_env,
+            bytecode_cache=bytecode_cache,
         )
 
-    def add_to_group_index(self, row):
+    @property
+    def template_version(self):
+        # read from the sources of the templates, so only when first needed
+        return getattr(self.renderer, "template_version", None)
+
+    def row_groups(self, row):
         if self.group_field and self.group_field in row and row[self.group_field]:
-            groups = [row[self.group_field]]
+            return [row[self.group_field]]
         elif (
             self.group_field
             and self.group_list_field in row
             and row[self.group_list_field]
         ):
-            groups = row[self.group_list_field].split(";")
+            return row[self.group_list_field].split(";")
         else:
-            groups = [None]
+            return [None]
+
+    def new_set(self, name):
+        return self.store.set(name) if self.store else set()
 
-        for group in groups:
+    def new_items(self):
+        return self.store.items() if self.store else IndexItems()
+
+    def add_to_group_index(self, row):
+        for group in self.row_groups(row):
             self.add_row_to_group_map(group, row)
 
     @property
     def group_index(self):
-        for group, idx in self.group_map.items():
-            self.group_map[group]["items"] = sorted(
-                idx["items"], key=lambda x: AlphaNumericSort.alphanum(x["reference"])
-            )
-
         result = OrderedDict(
             sorted(self.group_map.items(), key=lambda x: x[1]["text"] or "")
         )
@@ -152,11 +417,11 @@ class Renderer:
         else:
             raise NotImplementedError("group_field %s not supported" % self.group_field)
 
-        o = {
-            "text": name_map_func(group) or group,
-            "items": [],
-        }
-        self.group_map.setdefault(group, o)
+        if group not in self.group_map:
+            self.group_map[group] = {
+                "text": name_map_func(group) or group,
+                "items": self.new_items(),
+            }
         reference = (
             row[self.key_field] if self.key_field in row else row["slug"].split("/")[-1]
         )
@@ -171,60 +436,191 @@ class Renderer:
         self.group_slug_seen.add(dupe_check_key)
 
     def render_dataset(self, dataset_path):
-        repo = EntryRepository(dataset_path)
-        slugs = repo.list_slugs()
-        reader = (Entity(repo.find_by_slug(slug), self.schema) for slug in slugs)
-        self.render(reader)
-
-    def render(self, reader):
-        self.slugs = set()
-        rows = []
-        for idx, entity in enumerate(reader, start=1):
-            if self.limit and idx > self.limit:
-                break
-
-            row = entity.snapshot()
+        # a SQLite dataset of entries, or a flattened dataset file
+        checkpoint = self.load_checkpoint() if self.resume else None
+        start = checkpoint["count"] if checkpoint else 0
+        if Path(dataset_path).suffix in ROW_FORMATS:
+            reader = read_rows(dataset_path, start=start, shard=self.shard)
+        else:
+            reader = read_entities(
+                dataset_path, self.schema, start=start, shard=self.shard
+            )
+        self.render(reader, checkpoint)
+
+    def render(self, reader, checkpoint=None):
+        # a checkpoint given is one the reader has already been moved past
+        start = perf_counter()
+        self.slugs = self.new_set("slugs")
+        if checkpoint is None and self.resume:
+            checkpoint = self.load_checkpoint()
+            if checkpoint:
+                reader = islice(reader, checkpoint["count"], None)
+        if self.store and not checkpoint:
+            self.store.clear()
+        count = self.restore_checkpoint(checkpoint) if checkpoint else 0
+        if self.limit:
+            reader = islice(reader, max(self.limit - count, 0))
+
+        if self.jobs and self.jobs > 1:
+            rows = self.render_entities_parallel(reader)
+        else:
+            rows = (self.render_entity(entity) for entity in reader)
+
+        last_checkpoint = perf_counter()
+        for row in rows:
+            count += 1
+            if (
+                self.checkpoint_interval
+                and perf_counter() - last_checkpoint > self.checkpoint_interval
+            ):
+                # saved before the row, which may have been rendered but isn't indexed
+                self.save_checkpoint(count - 1)
+                last_checkpoint = perf_counter()
 
             if not row:
-                continue  # Sometimes there are no active entries (all in the future)
+                continue
 
-            if not row["slug"]:
-                continue  # skip rows without a unique slug
+            with self.profiler.phase("index"):
+                self.add_to_group_index(row)
 
-            self.add_to_group_index(row)
+                if row["slug"] in self.slugs:
+                    logging.warning("Duplicate slug found: %s", row["slug"])
+                else:
+                    self.add_to_site_indexes(row)
 
-            if row["slug"] in self.slugs:
-                logging.warning("Duplicate slug found: %s", row["slug"])
-
-            breadcrumb = slug_to_breadcrumb(row["slug"], row[self.key_field])
+                self.add_to_index(row["slug"], row)
+                self.slugs.add(row["slug"])
 
-            path = "/".join(row["slug"].split("/")[2:])  # strip the prefix from slug
+        self.finish(start)
 
-            output_dir = self.docs / path
-            if not output_dir.exists():
-                output_dir.mkdir(parents=True)
-
-            for field in self.geometry_fields:
-                if field in row and row[field]:
-                    create_geometry_file(output_dir, row, field)
-                    row["geometry_url"] = "geometry.geojson"
-                    break
+    def render_dataset_diff(self, previous_dataset_path, dataset_path):
+        # renders only the entities which changed since the dataset was
+        # previous_dataset_path, when built from it into the same docs
+        state = self.load_state() if self.manifest else None
+        if state is None:
+            logging.info(
+                f"no earlier build of {self.pipeline_name} to update, rendering every entity"
+            )
+            return self.render_dataset(dataset_path)
+        self.render_changes(
+            diff_entities(previous_dataset_path, dataset_path, self.schema), state
+        )
 
-            self.renderer.render_row(
-                str(output_dir / "index.html"),
-                row=row,
-                entity=entity,
-                pipeline_name=self.pipeline_name,
-                breadcrumb=breadcrumb,
-                schema=self.schema,
-                typology=self.typology,
-                key_field=self.key_field,
+    def render_changes(self, changes, state):
+        """
+        Renders the entities which changed since the build the state was
+        saved from, given as pairs of the previous entity and the entity,
+        either of which is None for an added or removed entity. Only the row
+        pages of those entities and the index pages above them are rendered,
+        every other page of the earlier build is kept, and pages for removed
+        entities are deleted. Entities are rendered in this process.
+        """
+        if self.spatial_bundle or self.search_index or self.sitemap:
+            raise ValueError(
+                "spatial bundles, search indexes and sitemaps need every entity rendered"
             )
-            rows.append(row)
+        start = perf_counter()
+        self.load_index_state(state)
+        self.manifest.carry_forward()
+        changes = list(changes)
+
+        # remove every changed entity first, so one moved to a slug of another
+        # changed entity is added back after it
+        paths = set()
+        removed = {}
+        for previous, entity in changes:
+            row = previous.snapshot() if previous else None
+            if row and row["slug"]:
+                paths.update(self.remove_from_indexes(row, removed))
+        for group, slugs in removed.items():
+            if group in self.group_map:
+                self.group_map[group]["items"].remove(slugs)
+                if not self.group_map[group]["items"]:
+                    del self.group_map[group]
+
+        for previous, entity in changes:
+            row = self.render_entity(entity) if entity else None
+            if not row:
+                continue
+            self.add_to_group_index(row)
             self.add_to_index(row["slug"], row)
             self.slugs.add(row["slug"])
+            paths.update(ancestor_paths(row["slug"]))
+
+        for path in paths | {""}:
+            page = 1
+            while self.manifest.forget(self.docs / path / index_page_path(page)):
+                page += 1
+        self.finish(start, paths)
+
+    def remove_from_indexes(self, row, removed):
+        # removes a row rendered by an earlier build, returning the paths of
+        # the index pages it was on, and adding its slug to removed by group
+        slug = row["slug"]
+        output_dir = self.docs / "/".join(slug.split("/")[2:])
+        self.manifest.forget(output_dir / "index.html")
+        self.manifest.forget(output_dir / "geometry.geojson")
+
+        _, __, path = slug.split("/", 2)
+        if path.find("/") > 0:
+            self.index.remove(path, row[self.key_field])
+        for group in self.row_groups(row):
+            self.group_slug_seen.discard((group, slug))
+            removed.setdefault(group, set()).add(slug)
+        self.slug_seen.discard(slug)
+        self.slugs.discard(slug)
+        return ancestor_paths(slug)
+
+    def finish(self, start, paths=None):
+        # renders the index pages, of only the paths given and the root when
+        # paths isn't None, and completes the build
+        if self.shard:
+            # index pages are rendered once the index of every shard is merged
+            with self.profiler.phase("flush"):
+                self.writer.flush()
+            self.save_shard_state()
+        else:
+            self.finish_index_pages(paths)
+
+        if self.manifest:
+            self.manifest.remove_stale()
+            self.manifest.save()
+            if not self.shard and not (self.store and self.store.temporary):
+                self.save_state()
+        self.remove_checkpoint()
+        # the writer given is left open for the caller to close, as it may be
+        # shared with other renderers, so only the threads wrapping it stop
+        if self.compress:
+            self.writer.shutdown()
+        else:
+            self.writer.flush()
 
+        self.profiler.add("total", perf_counter() - start)
+        if self.profiler is not NULL_PROFILER:
+            logging.info(
+                f"render profile for {self.pipeline_name}:\n{self.profiler.summary()}"
+            )
+        if self.profile and self.profile is not True:
+            self.profiler.save(self.profile)
+
+    def finish_index_pages(self, paths=None):
         root_index = {"pipeline_name": self.pipeline_name}
+
+        if self.spatial_bundle:
+            with self.profiler.phase("spatial-bundle"):
+                bundles = self.spatial_bundle.finish(self.writer, self.manifest)
+            for group, path in bundles.items():
+                url = f"./{path}/{SpatialBundle.index_filename}"
+                if group is None:
+                    root_index["geometry_bundle_url"] = url
+                elif group in self.group_map:
+                    self.group_map[group]["geometry_bundle_url"] = url
+
+        if self.search_index:
+            with self.profiler.phase("search-index"):
+                url = self.search_index.finish(self.writer, self.manifest)
+            root_index["search_index_url"] = f"./{url}"
+
         if self.group_field:
             root_index["groups"] = self.group_index
         else:
@@ -233,97 +629,486 @@ class Renderer:
         root_index["group_field"] = self.group_field
         root_index["count"] = len(self.slug_seen)
 
-        self.index[""] = root_index
-        self.render_index_pages()
+        self.root_index = root_index
+
+        # all of the row pages must have landed before the index pages
+        with self.profiler.phase("flush"):
+            self.writer.flush()
+        with self.profiler.phase("index-pages"):
+            self.render_index_pages(paths)
+        if self.sitemap:
+            self.sitemap.finish(self.writer, self.manifest)
+        with self.profiler.phase("flush"):
+            self.writer.flush()
+
+    def render_entity(self, entity):
+        start = perf_counter()
+        with self.profiler.phase("snapshot"):
+            row = entity.snapshot()
 
-    def add_to_index(self, slug, row):
-        _, __, stem = slug.split("/", 2)
-        self._add_to_index(stem, row)
+        if not row:
+            return None  # Sometimes there are no active entries (all in the future)
 
-    def _add_to_index(self, slug, row=None):
-        if slug.find("/") <= 0:
-            # no more parts of the path to index
-            return
+        if not row["slug"]:
+            return None  # skip rows without a unique slug
 
-        stem, name = slug.rsplit("/", 1)
+        if self.shard and not in_shard(row["slug"], self.shard):
+            return None
 
-        # safer to use tke key_field if available
-        if row:
-            name = row[self.key_field]
+        with self.profiler.phase("breadcrumb"):
+            breadcrumb = slug_to_breadcrumb(row["slug"], row[self.key_field])
 
-        self.index[stem].setdefault("items", [])
-        self.index[stem].setdefault("references", set())
-        self.index[stem].setdefault("count", 0)
-        self.index[stem].setdefault("group_field", None)
+        path = "/".join(row["slug"].split("/")[2:])  # strip the prefix from slug
+
+        output_dir = self.docs / path
+
+        geometry_field = self.geometry_field(row)
+        geometry = None
+        if geometry_field and self.spatial_bundle:
+            with self.profiler.phase("spatial-bundle"):
+                geometry = self.add_to_spatial_bundle(row, geometry_field, path)
+
+        if self.manifest:
+            with self.profiler.phase("manifest"):
+                input_hash = self.manifest.hash_input(
+                    row,
+                    entity_entries(entity),
+                    breadcrumb,
+                    self.template_version,
+                    self.geometry_options,
+                    self.compress,
+                )
+                unchanged = self.manifest.unchanged(
+                    output_dir / "index.html",
+                    input_hash,
+                    dependants=[output_dir / "geometry.geojson"],
+                )
+            if unchanged:
+                return row
+
+        if geometry_field:
+            with self.profiler.phase("geometry"):
+                create_geometry_file(
+                    output_dir,
+                    row,
+                    geometry_field,
+                    manifest=self.manifest,
+                    writer=self.writer,
+                    geometry=geometry,
+                    **self.geometry_options,
+                )
+            row["geometry_url"] = "geometry.geojson"
+
+        self.renderer.render_row(
+            str(output_dir / "index.html"),
+            row=row,
+            entity=entity,
+            pipeline_name=self.pipeline_name,
+            breadcrumb=breadcrumb,
+            schema=self.schema,
+            typology=self.typology,
+            key_field=self.key_field,
+        )
+        self.profiler.page(path, perf_counter() - start)
+        return row
+
+    def geometry_field(self, row):
+        for field in self.geometry_fields:
+            if field in row and row[field]:
+                return field
+        return None
+
+    def add_to_spatial_bundle(self, row, field, path):
+        precision = self.geometry_options["precision"]
+        try:
+            shape = wkt_to_geometry(row[field], precision)
+            geometry = geometry_to_geojson(shape, precision)
+        except Exception as e:
+            logging.exception(e)
+            return None
+
+        if not shape.is_empty:
+            properties = feature_properties(
+                row, self.geometry_options["properties"], self.geometry_fields
+            )
+            properties["href"] = f"{self.url_root}{path}"
+            self.spatial_bundle.add(
+                feature(geometry, properties),
+                shape.bounds,
+                [group for group in self.row_groups(row) if group],
+            )
+        return geometry
 
-        if name in self.index[stem]["references"]:
-            return
+    @property
+    def state_version(self):
+        # changes with the options which change the pages of a build
+        return BuildManifest.hash_input(
+            self.template_version,
+            self.geometry_options,
+            self.compress,
+            self.index_page_size,
+            self.group_field,
+            self.key_field,
+            self.url_root,
+        )
 
-        self.index[stem]["references"].add(name)
-        self.index[stem]["count"] += 1
+    def index_state(self, portable=False):
+        # the index pages of a build, so it can be updated with the changes to
+        # a dataset, or merged with other shards when portable
+        if self.store and not portable:
+            # the index is in the store, as it was when last committed
+            self.store.save_groups(self.group_map)
+            self.store.commit()
+            return {"version": self.state_version, "store": str(self.store.path)}
+
+        return {
+            "version": self.state_version,
+            "index": self.index.state(),
+            "groups": [
+                [group, value["text"], [entry.state() for entry in value["items"]]]
+                for group, value in self.group_map.items()
+            ],
+            "slugs": sorted(self.slug_seen),
+        }
 
-        reference = format_name(name) if not row else name
-        href = slug_to_relative_href(slug, strip_prefix=stem)
-        text = self.row_name(row) if row else None
-        end_date = row.get("end-date", "") if row else ""
+    def load_index_state(self, state):
+        if self.store:
+            self.group_map = self.store.load_groups()
+            self.slugs = self.new_set("slugs")
+            return
 
-        self.index[stem]["items"].append(
-            self.index_entry(reference, text, href, end_date=end_date)
+        self.index = SlugTrie.from_state(state["index"])
+        self.group_map = {}
+        self.group_slug_seen = set()
+        for group, text, entries in state["groups"]:
+            items = IndexItems(IndexEntry(*values) for values in entries)
+            self.group_map[group] = {"text": text, "items": items}
+            self.group_slug_seen.update((group, entry.slug) for entry in items.entries)
+        self.slug_seen = set(state["slugs"])
+        self.slugs = set(self.slug_seen)
+
+    def save_state(self):
+        path = self.docs / self.state_filename
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.index_state(), f)
+        os.replace(tmp_path, path)
+
+    def load_state(self):
+        # the state saved by an earlier build with the same options, or None
+        path = self.docs / self.state_filename
+        if not path.exists():
+            return None
+        with open(path) as f:
+            state = json.load(f)
+        return state if self.state_matches(state) else None
+
+    def state_matches(self, state):
+        # whether the state was saved with the same options, and index store
+        return state.get("version") == self.state_version and ("store" in state) == (
+            self.store is not None
         )
-        self._add_to_index(stem)
 
-    def index_entry(self, reference, text, href=None, slug=None, end_date=""):
-        if href:
-            return {
-                "reference": reference,
-                "text": text,
-                "href": href,
-                "end-date": end_date,
-            }
-        elif slug:
-            return {
-                "reference": reference,
-                "text": text,
-                "slug": slug,
-                "end-date": end_date,
+    def shard_state_path(self, number, count):
+        return self.docs / self.shard_state_filename.format(number, count)
+
+    def save_shard_state(self):
+        path = self.shard_state_path(*self.shard)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.index_state(portable=True), f)
+
+    def merge_shards(self, count):
+        """
+        Renders the index pages of a build split into count shards, from the
+        index state saved by each shard into docs, as a single render of every
+        entity would. Entries are merged in slug order, the order a dataset is
+        read in, so the pages come out the same.
+        """
+        start = perf_counter()
+        if self.manifest and isinstance(self.renderer, JinjaRenderer):
+            # the row pages are in the manifests of the shards
+            self.manifest = self.renderer.manifest = BuildManifest(
+                self.docs, "index", self.compress
+            )
+
+        self.slugs = self.new_set("slugs")
+        entries = []
+        groups = {}
+        for number in range(1, count + 1):
+            with open(self.shard_state_path(number, count)) as f:
+                state = json.load(f)
+            # shard states are portable, so hold the index whatever the store
+            if state["version"] != self.state_version:
+                raise ValueError(
+                    f"shard {number} of {count} was built with other options"
+                )
+            for path, node in SlugTrie.from_state(state["index"]).walk():
+                entries.extend((path, entry) for entry in node.entries.values())
+            for group, text, values in state["groups"]:
+                groups.setdefault(group, [text, []])[1].extend(
+                    IndexEntry(*entry) for entry in values
+                )
+            for slug in state["slugs"]:
+                self.slug_seen.add(slug)
+                self.slugs.add(slug)
+
+        # of entries with the same reference, the first slug is kept
+        entries.sort(key=lambda entry: (entry[0], entry[1].href))
+        for path, entry in entries:
+            name = posixpath.basename(entry.href)
+            self.index.add(f"{path}/{name}", entry.reference, entry)
+        for group, (text, items) in sorted(
+            groups.items(),
+            key=lambda group: min((entry.slug for entry in group[1][1]), default=""),
+        ):
+            self.group_map[group] = {"text": text, "items": self.new_items()}
+            for entry in sorted(items, key=attrgetter("slug")):
+                self.group_map[group]["items"].append(entry)
+                self.group_slug_seen.add((group, entry.slug))
+
+        self.finish(start)
+
+    def save_checkpoint(self, count):
+        # pages of the entities read so far must land before they're counted
+        with self.profiler.phase("checkpoint"):
+            self.writer.flush()
+            checkpoint = {
+                "count": count,
+                "state": self.index_state(),
+                "manifest": self.manifest.current if self.manifest else None,
+                "search_index": (
+                    self.search_index.state() if self.search_index else None
+                ),
+                "sitemap": self.sitemap.state() if self.sitemap else None,
             }
+            path = self.docs / self.checkpoint_filename
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(checkpoint, f)
+            os.replace(tmp_path, path)
+        logging.info(f"checkpoint of {self.pipeline_name} after {count} entities")
+
+    def load_checkpoint(self):
+        # the checkpoint of an unfinished render with the same options, or None
+        path = self.docs / self.checkpoint_filename
+        if not path.exists():
+            return None
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if not self.state_matches(checkpoint["state"]):
+            logging.warning(
+                f"ignoring checkpoint of {self.pipeline_name} with other options"
+            )
+            return None
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint):
+        # returns the number of entities read before the checkpoint
+        self.load_index_state(checkpoint["state"])
+        if self.manifest:
+            self.manifest.update(checkpoint["manifest"])
+        if self.search_index:
+            self.search_index.restore(checkpoint["search_index"])
+        if self.sitemap:
+            self.sitemap.restore(checkpoint["sitemap"])
+        logging.info(
+            f"resuming {self.pipeline_name} after {checkpoint['count']} entities"
+        )
+        return checkpoint["count"]
+
+    def remove_checkpoint(self):
+        path = self.docs / self.checkpoint_filename
+        if path.exists():
+            path.unlink()
+
+    def drain_worker_state(self):
+        # state gathered in a worker process to be merged by the parent
+        return {
+            "manifest": self.manifest.drain() if self.manifest else None,
+            "spatial_bundle": (
+                self.spatial_bundle.drain() if self.spatial_bundle else None
+            ),
+            "profiler": self.profiler.drain(),
+        }
+
+    def update_worker_state(self, state):
+        if self.manifest:
+            self.manifest.update(state["manifest"])
+        if self.spatial_bundle:
+            self.spatial_bundle.update(state["spatial_bundle"])
+        self.profiler.update(state["profiler"])
+
+    def render_entities_parallel(self, reader):
+        # rows are yielded in reader order so the index is built exactly as in
+        # the serial path, with at most a few chunks per worker in flight
+        reader = iter(reader)
+        # worker_kwargs hold the writer and Jinja environment, which can't be
+        # pickled, so workers must be forked whatever the platform default
+        with ProcessPoolExecutor(
+            max_workers=self.jobs,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(self.worker_kwargs,),
+        ) as executor:
+            pending = deque()
+            while True:
+                chunk = list(islice(reader, self.job_chunksize))
+                if chunk:
+                    pending.append(executor.submit(_render_entities, chunk))
+                if pending and (not chunk or len(pending) >= self.jobs * 2):
+                    rows, state = pending.popleft().result()
+                    self.update_worker_state(state)
+                    yield from rows
+                if not chunk and not pending:
+                    break
+
+    def add_to_index(self, slug, row):
+        _, __, path = slug.split("/", 2)
+        if path.find("/") <= 0:
+            # rows at the top of the dataset are only on the root index page
+            return
+
+        name = path.rsplit("/", 1)[1]
+        self.index.add(
+            path,
+            row[self.key_field],
+            self.index_entry(
+                row[self.key_field],
+                self.row_name(row),
+                f"./{name}",
+                end_date=row.get("end-date", ""),
+            ),
+        )
+
+    def add_to_site_indexes(self, row):
+        path = "/".join(row["slug"].split("/")[2:])
+        if self.search_index:
+            self.search_index.add(
+                row.get(self.key_field, path),
+                self.row_name(row),
+                row.get("organisation", ""),
+                f"{self.url_root}{path}",
+            )
+        if self.sitemap:
+            self.sitemap.add(path, self.writer, self.manifest)
+
+    def index_pages(self, paths=None):
+        if paths is None:
+            nodes = self.index.walk()
         else:
-            raise ValueError("index entry requires href or slug")
+            nodes = ((path, self.index.find(path)) for path in sorted(paths) if path)
+        for path, node in nodes:
+            if node is None:
+                continue
+            # a page held in the store is read in order as it is rendered
+            items = node.items(
+                self.index_entry(format_name(part), None, f"./{part}")
+                for part in node.directories()
+            )
+            yield path, {"count": len(items), "items": items, "group_field": None}
+        yield "", self.root_index
 
-    def render_index_pages(self):
-        for path, i in self.index.items():
+    def index_entry(self, reference, text, href=None, slug=None, end_date=""):
+        return IndexEntry(reference, text, href=href, slug=slug, end_date=end_date)
+
+    def render_index_pages(self, paths=None):
+        for path, i in self.index_pages(paths):
             if path:
                 slug = f"/{self.pipeline_name}/{path}"
                 download_url = None
             else:
                 slug = f"/{self.pipeline_name}"
                 download_url = generate_download_link(self.pipeline_name)
-            if "items" in i:
-                for item in i["items"]:
-                    if "slug" in item:
-                        item["href"] = slug_to_relative_href(
-                            item["slug"], "/".join([self.pipeline_name, path])
+            relative_to = "/".join([self.pipeline_name, path])
+
+            for page, kwargs in self.paginate(i):
+                # links are relative to the directory of the page, which is
+                # two below the first page for the pages after it
+                base = "./" if page == 1 else "../../"
+                kwargs.update(
+                    breadcrumb=[
+                        (
+                            dict(crumb, href=rebase_href(crumb["href"], base))
+                            if "href" in crumb
+                            else crumb
                         )
-                        del item["slug"]
-                i["items"] = sorted(
-                    i["items"], key=lambda x: AlphaNumericSort.alphanum(x["reference"])
+                        for crumb in slug_to_breadcrumb(slug)
+                    ],
+                    download_url=download_url,
                 )
-
-            for group in i.get("groups", {}).values():
-                for item in group.get("items", []):
-                    if "slug" in item:
-                        item["href"] = slug_to_relative_href(
-                            item["slug"], "/".join([self.pipeline_name, path])
+                for name in ["geometry_bundle_url", "search_index_url"]:
+                    if name in kwargs:
+                        kwargs[name] = rebase_href(kwargs[name], base)
+
+                # index entries are only turned into dicts for the template
+                if "items" in kwargs:
+                    kwargs["items"] = [
+                        item.to_dict(relative_to, base) for item in kwargs["items"]
+                    ]
+
+                if "groups" in kwargs:
+                    groups = OrderedDict()
+                    for group_key, group in kwargs["groups"].items():
+                        group = dict(
+                            group,
+                            items=[
+                                item.to_dict(relative_to, base)
+                                for item in group["items"]
+                            ],
                         )
-                        del item["slug"]
-
-            logging.debug("rendering %s", path)
-            self.renderer.render_index(
-                str(self.docs / path / "index.html"),
-                **i,
-                breadcrumb=slug_to_breadcrumb(slug),
-                download_url=download_url,
+                        if "geometry_bundle_url" in group:
+                            group["geometry_bundle_url"] = rebase_href(
+                                group["geometry_bundle_url"], base
+                            )
+                        groups[group_key] = group
+                    kwargs["groups"] = groups
+
+                index_path = self.docs / path / index_page_path(page)
+                if self.sitemap:
+                    self.sitemap.add(
+                        posixpath.dirname(posixpath.join(path, index_page_path(page))),
+                        self.writer,
+                        self.manifest,
+                    )
+                if self.manifest and self.manifest.unchanged(
+                    index_path,
+                    self.manifest.hash_input(
+                        kwargs, self.template_version, self.compress
+                    ),
+                ):
+                    continue
+
+                logging.debug("rendering %s page %s", path, page)
+                self.renderer.render_index(str(index_path), **kwargs)
+
+    def paginate(self, i):
+        # yields the number and arguments of each page of an index, splitting
+        # the items, or the items of each group, across pages
+        if not self.index_page_size:
+            yield 1, dict(i)
+            return
+
+        # items are read a page at a time, as they may be held in a store
+        if "groups" in i:
+            size = sum(len(group["items"]) for group in i["groups"].values())
+            count = max(math.ceil(size / self.index_page_size), 1)
+            pages = paginate_groups(i["groups"], self.index_page_size)
+            key = "groups"
+            # pages list only some groups, so the count of every group
+            i = dict(i, group_count=len(i["groups"]))
+        else:
+            items = i.get("items", [])
+            count = max(math.ceil(len(items) / self.index_page_size), 1)
+            remaining = iter(items)
+            pages = (
+                list(islice(remaining, self.index_page_size)) for _ in range(count)
             )
+            key = "items"
+
+        for page, content in enumerate(pages, 1):
+            yield page, dict(i, **{key: content}, pagination=pagination(page, count))
 
     def row_name(self, row):
         if self.pipeline_name == "developer-agreement":
@@ -334,6 +1119,20 @@ class Renderer:
         return row[self.key_field]
 
 
+_worker_renderer = None
+
+
+def _init_worker(kwargs):
+    global _worker_renderer
+    _worker_renderer = Renderer(**dict(kwargs, writer=kwargs["writer"].worker_writer()))
+
+
+def _render_entities(entities):
+    rows = [_worker_renderer.render_entity(entity) for entity in entities]
+    _worker_renderer.writer.flush()
+    return rows, _worker_renderer.drain_worker_state()
+
+
 re_all_upper = re.compile(r"^[A-Z]*$")
 re_strip = re.compile(r"[^a-zA-Z]")
 
@@ -369,36 +1168,94 @@ def slug_to_breadcrumb(slug, reference=None):
     return breadcrumb
 
 
-def slug_to_relative_href(slug, strip_prefix=None):
-    logging.debug(">> slug_to_relative_href(%s, %s)", slug, strip_prefix)
-    if slug.startswith("/"):
-        slug = slug[1:]
+def entity_entries(entity):
+    # the entries of an entity, listed by row templates as its history
+    return [
+        [entry.data, entry.resource, entry.line_num]
+        for entry in getattr(entity, "entries", ())
+    ]
+
+
+def ancestor_paths(slug):
+    # the paths of the index pages below the root which list the slug
+    parts = slug.split("/")[2:]
+    return ["/".join(parts[:n]) for n in range(1, len(parts))]
+
+
+def index_page_path(page):
+    return "index.html" if page == 1 else f"page/{page}/index.html"
 
-    if strip_prefix and slug.startswith(strip_prefix):
-        slug = slug[len(strip_prefix) :]
-        if slug.startswith("/"):
-            slug = slug[1:]
 
-    logging.debug("<< " + str(strip_prefix) + "   ./" + slug)
-    return "./" + slug
+def page_href(page, current):
+    if page == 1:
+        return "../../"
+    return f"./page/{page}/" if current == 1 else f"../{page}/"
 
 
-def create_geometry_file(output_dir, row, field):
+def pagination(page, pages):
+    # parameters for the dlContentPagePagination component
+    params = {"page": page, "pages": pages}
+    if page > 1:
+        params["previous"] = {
+            "href": page_href(page - 1, page),
+            "label": f"{page - 1} of {pages}",
+        }
+    if page < pages:
+        params["next"] = {
+            "href": page_href(page + 1, page),
+            "label": f"{page + 1} of {pages}",
+        }
+    return params
+
+
+def paginate_groups(groups, page_size):
+    # yields pages of up to page_size items, continuing a group which doesn't
+    # fit onto the next page, with the items of each group read a page at a
+    # time, as they may be held in a store, and the count of all of them
+    page = OrderedDict()
+    size = 0
+    for group_key, group in groups.items():
+        items = iter(group["items"])
+        remaining = len(group["items"])
+        while True:
+            if size == page_size and remaining:
+                yield page
+                page = OrderedDict()
+                size = 0
+            count = min(page_size - size, remaining)
+            page[group_key] = dict(
+                group, items=list(islice(items, count)), count=len(group["items"])
+            )
+            size += count
+            remaining -= count
+            if not remaining:
+                break
+    yield page
+
+
+def create_geometry_file(
+    output_dir,
+    row,
+    field,
+    manifest=None,
+    writer=None,
+    precision=None,
+    properties=None,
+    exclude=(),
+    geometry=None,
+):
     try:
-        geojson = {"type": "Feature"}
-        geojson["geometry"] = wkt_to_json_geometry(row[field])
-        geojson["properties"] = row
-        with open(output_dir / "geometry.geojson", "w") as f:
-            json.dump(geojson, f)
+        content = geojson_feature(
+            row, field, precision, properties, exclude, geometry=geometry
+        )
+        path = output_dir / "geometry.geojson"
+        if manifest and not manifest.changed(path, content):
+            return
+        (writer or FileWriter()).write(path, content)
     except Exception as e:
         logging.exception(e)
 
 
-def wkt_to_json_geometry(input_):
-    shape = shapely.wkt.loads(input_)
-    return shapely.geometry.mapping(shape)
-
-
 class AlphaNumericSort:
     @staticmethod
     def convert(text):
@@ -406,4 +1263,4 @@ class AlphaNumericSort:
 
     @classmethod
     def alphanum(cls, key):
-        return [cls.convert(c) for c in re.split("([0-9]+)", key)]
+        return natural_sort_key(key)
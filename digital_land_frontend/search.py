@@ -0,0 +1,87 @@
+import json
+import re
+
+re_token = re.compile("[a-z0-9]+")
+
+
+def tokens(text):
+    return re_token.findall(text.lower()) if text else []
+
+
+class SearchIndex:
+    """
+    A search index of the entities rendered for a dataset, split into JSON
+    shards keyed by the prefix of the words of their reference and name.
+    Shards holding more than shard_size entities are split on a longer
+    prefix, so a browser can look an entity up by fetching index.json, then
+    the shard with the longest prefix which starts the query, or for a short
+    query, the shards whose prefix starts with the query.
+    """
+
+    directory = "search"
+    index_filename = "index.json"
+    fields = ["reference", "name", "organisation", "href"]
+    shard_size = 2000
+    max_prefix_length = 4
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.entries = []
+        # token, truncated to max_prefix_length: ids of the entries with it
+        self.postings = {}
+
+    def add(self, reference, name, organisation, href):
+        entry_id = len(self.entries)
+        self.entries.append([reference, name or "", organisation or "", href])
+
+        keys = set(tokens(reference) + tokens(name))
+        keys.add("".join(tokens(reference)))
+        for key in keys:
+            if key:
+                self.postings.setdefault(key[: self.max_prefix_length], []).append(
+                    entry_id
+                )
+
+    def state(self):
+        return {"entries": self.entries, "postings": self.postings}
+
+    def restore(self, state):
+        self.entries = state["entries"]
+        self.postings = state["postings"]
+
+    def shards(self, keys=None, length=1):
+        # yields the prefix and entry ids of each shard
+        if keys is None:
+            keys = sorted(self.postings)
+
+        groups = {}
+        for key in keys:
+            groups.setdefault(key[:length], []).append(key)
+
+        for prefix, group in groups.items():
+            entry_ids = sorted(set(i for key in group for i in self.postings[key]))
+            splittable = any(len(key) > length for key in group)
+            if (
+                len(entry_ids) > self.shard_size
+                and splittable
+                and length < self.max_prefix_length
+            ):
+                yield from self.shards(group, length + 1)
+            else:
+                yield prefix, entry_ids
+
+    def finish(self, writer, manifest=None):
+        index = {"fields": self.fields, "shards": {}}
+        for prefix, entry_ids in self.shards():
+            index["shards"][prefix] = len(entry_ids)
+            self.write(
+                f"{prefix}.json", [self.entries[i] for i in entry_ids], writer, manifest
+            )
+        self.write(self.index_filename, index, writer, manifest)
+        return f"{self.directory}/{self.index_filename}"
+
+    def write(self, filename, value, writer, manifest=None):
+        path = self.docs / self.directory / filename
+        content = json.dumps(value, separators=(",", ":"))
+        if not manifest or manifest.changed(path, content):
+            writer.write(path, content)
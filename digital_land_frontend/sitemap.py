@@ -0,0 +1,81 @@
+import gzip
+from xml.sax.saxutils import escape
+
+XMLNS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+class Sitemap:
+    """
+    Writes the URLs of the pages rendered as a set of sitemap files, each
+    of at most max_urls URLs, and a sitemap.xml index of them. URLs are
+    written out as each file fills, so only one file is held in memory.
+    """
+
+    max_urls = 50000
+    index_filename = "sitemap.xml"
+
+    def __init__(self, docs, base_url, url_root="/", compress=False):
+        # base_url is the site the pages are published on, url_root their path
+        self.docs = docs
+        self.base_url = base_url.rstrip("/") + url_root
+        self.compress = compress
+        self.urls = []
+        self.filenames = []
+
+    def add(self, path, writer, manifest=None):
+        path = path.strip("/")
+        self.urls.append(f"{self.base_url}{path}/" if path else self.base_url)
+        if len(self.urls) >= self.max_urls:
+            self.write_urls(writer, manifest)
+
+    def state(self):
+        return {"urls": self.urls, "filenames": self.filenames}
+
+    def restore(self, state):
+        self.urls = state["urls"]
+        self.filenames = state["filenames"]
+
+    def write_urls(self, writer, manifest=None):
+        suffix = ".xml.gz" if self.compress else ".xml"
+        filename = f"sitemap-{len(self.filenames) + 1}{suffix}"
+        self.filenames.append(filename)
+        self.write(
+            filename,
+            "".join(
+                [f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{XMLNS}">\n']
+                + [f"<url><loc>{escape(url)}</loc></url>\n" for url in self.urls]
+                + ["</urlset>\n"]
+            ),
+            writer,
+            manifest,
+        )
+        self.urls = []
+
+    def finish(self, writer, manifest=None):
+        if self.urls or not self.filenames:
+            self.write_urls(writer, manifest)
+        self.write(
+            self.index_filename,
+            "".join(
+                [
+                    f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{XMLNS}">\n'
+                ]
+                + [
+                    f"<sitemap><loc>{escape(self.base_url + filename)}</loc></sitemap>\n"
+                    for filename in self.filenames
+                ]
+                + ["</sitemapindex>\n"]
+            ),
+            writer,
+            manifest,
+            compress=False,
+        )
+        return self.index_filename
+
+    def write(self, filename, content, writer, manifest=None, compress=None):
+        path = self.docs / filename
+        if self.compress if compress is None else compress:
+            # no timestamp, so unchanged sitemaps compress the same
+            content = gzip.compress(content.encode("utf-8"), mtime=0)
+        if not manifest or manifest.changed(path, content):
+            writer.write(path, content)
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from operator import itemgetter
+from pathlib import Path
+
+HILBERT_ORDER = 16
+
+
+def hilbert_index(x, y, order=HILBERT_ORDER):
+    # distance along a Hilbert curve filling a 2**order square grid
+    n = 1 << order
+    d = 0
+    s = n >> 1
+    while s > 0:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        d += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+
+def extent(records):
+    return [
+        min(r[0] for r in records),
+        min(r[1] for r in records),
+        max(r[2] for r in records),
+        max(r[3] for r in records),
+    ]
+
+
+class SpatialBundle:
+    """
+    Collects the features rendered for a dataset into a bundle of
+    newline-delimited GeoJSON, ordered along a Hilbert curve and packed into
+    chunks, with an index of the bounding box and byte range of every chunk.
+    A map can fetch the index then range-request only the chunks in view.
+
+    A bundle is written for the dataset, and for each group of features.
+    Features are spooled to a temporary file as they are added, and only
+    their bounds and spool offsets are kept in memory.
+    """
+
+    directory = "geometry"
+    features_filename = "features.geojsonl"
+    index_filename = "index.json"
+    chunk_size = 256
+
+    def __init__(self, docs, translations=None):
+        self.docs = Path(docs)
+        self.translations = translations
+        self.spool = None
+        self.spool_id = None
+        self.spools = []
+        # (minx, miny, maxx, maxy, spool, offset, length, groups)
+        self.records = []
+
+    def add(self, feature, bounds, groups=()):
+        if self.spool is None:
+            self.spool = tempfile.NamedTemporaryFile(
+                prefix="spatial-bundle-", suffix=".geojsonl", delete=False
+            )
+            self.spool_id = len(self.spools)
+            self.spools.append(self.spool.name)
+
+        data = feature.encode("utf-8") + b"\n"
+        offset = self.spool.tell()
+        self.spool.write(data)
+        self.records.append((*bounds, self.spool_id, offset, len(data), tuple(groups)))
+
+    def drain(self):
+        if self.spool is None:
+            return None
+        self.spool.flush()
+        state = {"spool": self.spool.name, "records": self.records}
+        self.records = []
+        return state
+
+    def update(self, state):
+        if not state:
+            return
+        if state["spool"] not in self.spools:
+            self.spools.append(state["spool"])
+        spool = self.spools.index(state["spool"])
+        self.records.extend(r[:4] + (spool,) + r[5:] for r in state["records"])
+
+    def group_path(self, group):
+        if group is None:
+            return self.directory
+        return f"{self.directory}/{group.translate(self.translations)}"
+
+    def finish(self, writer, manifest=None):
+        if self.spool is not None:
+            self.spool.flush()
+
+        bundles = {None: self.records}
+        for record in self.records:
+            for group in record[7]:
+                bundles.setdefault(group, []).append(record)
+
+        paths = {}
+        spools = [open(path, "rb") for path in self.spools]
+        try:
+            for group, records in bundles.items():
+                if records:
+                    paths[group] = self.group_path(group)
+                    self.write_bundle(paths[group], records, spools, writer, manifest)
+        finally:
+            for spool in spools:
+                spool.close()
+            self.cleanup()
+        return paths
+
+    def cleanup(self):
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+        for path in self.spools:
+            if os.path.exists(path):
+                os.unlink(path)
+        self.spools = []
+        self.records = []
+
+    def write_bundle(self, path, records, spools, writer, manifest=None):
+        bbox = extent(records)
+        width = (bbox[2] - bbox[0]) or 1
+        height = (bbox[3] - bbox[1]) or 1
+        scale = (1 << HILBERT_ORDER) - 1
+
+        def key(record):
+            x = ((record[0] + record[2]) / 2 - bbox[0]) / width
+            y = ((record[1] + record[3]) / 2 - bbox[1]) / height
+            return hilbert_index(int(x * scale), int(y * scale))
+
+        records = sorted(records, key=key)
+        chunks = [
+            records[start : start + self.chunk_size]
+            for start in range(0, len(records), self.chunk_size)
+        ]
+
+        def features():
+            for chunk in chunks:
+                for record in chunk:
+                    spool = spools[record[4]]
+                    spool.seek(record[5])
+                    yield spool.read(record[6])
+
+        index = {
+            "bbox": bbox,
+            "count": len(records),
+            "features": self.features_filename,
+            "chunks": [],
+        }
+        offset = 0
+        for chunk in chunks:
+            length = sum(map(itemgetter(6), chunk))
+            index["chunks"].append(extent(chunk) + [offset, length, len(chunk)])
+            offset += length
+
+        features_path = self.docs / path / self.features_filename
+        if manifest:
+            features_hash = hashlib.sha1()
+            for data in features():
+                features_hash.update(data)
+            changed = manifest.output_changed(features_path, features_hash.hexdigest())
+        else:
+            changed = True
+
+        if changed:
+            logging.debug(f"creating {features_path}")
+            writer.write_stream(features_path, features())
+
+        index_path = self.docs / path / self.index_filename
+        content = json.dumps(index)
+        if not manifest or manifest.changed(index_path, content):
+            writer.write(index_path, content)
@@ -0,0 +1,335 @@
+import heapq
+import json
+import sqlite3
+from operator import itemgetter
+
+from digital_land_frontend.index import IndexEntry, re_digits
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS page (path TEXT UNIQUE, parent TEXT, name TEXT);
+CREATE INDEX IF NOT EXISTS page_parent ON page (parent);
+CREATE TABLE IF NOT EXISTS page_entry (
+    path TEXT, sort_key BLOB,
+    reference TEXT, text TEXT, href TEXT, slug TEXT, end_date TEXT,
+    UNIQUE (path, reference)
+);
+CREATE INDEX IF NOT EXISTS page_entry_order ON page_entry (path, sort_key);
+CREATE TABLE IF NOT EXISTS item (
+    list INTEGER, sort_key BLOB,
+    reference TEXT, text TEXT, href TEXT, slug TEXT, end_date TEXT
+);
+CREATE INDEX IF NOT EXISTS item_order ON item (list, sort_key);
+CREATE TABLE IF NOT EXISTS member (
+    name TEXT, value TEXT, PRIMARY KEY (name, value)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS grouping (group_key TEXT, text TEXT, list INTEGER);
+"""
+
+ENTRY_FIELDS = "reference, text, href, slug, end_date"
+
+
+def encode_sort_key(text):
+    # bytes which sort in the same order as natural_sort_key(text), with
+    # numbers prefixed by their length, and text ended by a zero byte
+    parts = []
+    for n, part in enumerate(re_digits.split(text)):
+        if n % 2:
+            digits = part.lstrip("0") or "0"
+            parts.append(f"{len(digits):04d}{digits}")
+        else:
+            parts.append(part + "\0")
+    return "".join(parts).encode("utf-8")
+
+
+class IndexStore:
+    """
+    The index of a render held in a SQLite database rather than in memory,
+    for datasets too large for it. Index pages are read back a page at a
+    time, with the items of each group, and the entries of each directory
+    page, read in order from an index on their sort keys, so memory is
+    bounded by the largest index page. With a path, the index is kept
+    between builds, otherwise it is held in a temporary database removed
+    when the store is closed.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.temporary = path is None
+        # an empty name is a private temporary database on disk
+        self.conn = sqlite3.connect(str(path) if path else "")
+        self.conn.executescript(SCHEMA)
+        self.next_list = 1 + max(
+            self.conn.execute("SELECT MAX(list) FROM item").fetchone()[0] or 0,
+            self.conn.execute("SELECT MAX(list) FROM grouping").fetchone()[0] or 0,
+        )
+
+    def trie(self):
+        return StoredSlugTrie(self)
+
+    def items(self):
+        self.next_list += 1
+        return StoredIndexItems(self, self.next_list - 1)
+
+    def set(self, name):
+        return StoredSet(self, name)
+
+    def save_groups(self, group_map):
+        self.conn.execute("DELETE FROM grouping")
+        self.conn.executemany(
+            "INSERT INTO grouping (group_key, text, list) VALUES (?, ?, ?)",
+            [
+                (json.dumps(group), value["text"], value["items"].list_id)
+                for group, value in group_map.items()
+            ],
+        )
+
+    def load_groups(self):
+        return {
+            json.loads(group): {
+                "text": text,
+                "items": StoredIndexItems(self, list_id),
+            }
+            for group, text, list_id in self.conn.execute(
+                "SELECT group_key, text, list FROM grouping ORDER BY rowid"
+            )
+        }
+
+    def clear(self):
+        for table in ["page", "page_entry", "item", "member", "grouping"]:
+            self.conn.execute(f"DELETE FROM {table}")
+
+    def commit(self):
+        # uncommitted changes are lost if a render dies, so commit only
+        # with a checkpoint or saved state which matches them
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+class StoredIndexItems:
+    # IndexItems held in an IndexStore
+
+    __slots__ = ("store", "list_id")
+
+    def __init__(self, store, list_id):
+        self.store = store
+        self.list_id = list_id
+
+    def append(self, entry):
+        self.store.conn.execute(
+            f"INSERT INTO item (list, sort_key, {ENTRY_FIELDS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [self.list_id, encode_sort_key(entry.reference)] + entry.state(),
+        )
+
+    def remove(self, slugs):
+        slugs = list(slugs)
+        self.store.conn.execute(
+            f"DELETE FROM item WHERE list = ? AND slug IN ({', '.join('?' * len(slugs))})",
+            [self.list_id] + slugs,
+        )
+
+    def __iter__(self):
+        cursor = self.store.conn.execute(
+            f"SELECT {ENTRY_FIELDS} FROM item WHERE list = ? ORDER BY sort_key, rowid",
+            (self.list_id,),
+        )
+        return (IndexEntry(*values) for values in cursor)
+
+    def __len__(self):
+        return self.store.conn.execute(
+            "SELECT COUNT(*) FROM item WHERE list = ?", (self.list_id,)
+        ).fetchone()[0]
+
+
+class StoredSet:
+    # a set of JSON values held in an IndexStore
+
+    __slots__ = ("store", "name")
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+
+    def add(self, value):
+        self.store.conn.execute(
+            "INSERT OR IGNORE INTO member (name, value) VALUES (?, ?)",
+            (self.name, json.dumps(value)),
+        )
+
+    def discard(self, value):
+        self.store.conn.execute(
+            "DELETE FROM member WHERE name = ? AND value = ?",
+            (self.name, json.dumps(value)),
+        )
+
+    def __contains__(self, value):
+        return (
+            self.store.conn.execute(
+                "SELECT 1 FROM member WHERE name = ? AND value = ?",
+                (self.name, json.dumps(value)),
+            ).fetchone()
+            is not None
+        )
+
+    def __iter__(self):
+        cursor = self.store.conn.execute(
+            "SELECT value FROM member WHERE name = ?", (self.name,)
+        )
+        return (json.loads(value) for value, in cursor)
+
+    def __len__(self):
+        return self.store.conn.execute(
+            "SELECT COUNT(*) FROM member WHERE name = ?", (self.name,)
+        ).fetchone()[0]
+
+
+class StoredSlugTrie:
+    # a SlugTrie held in an IndexStore, with a node for each page read back
+
+    def __init__(self, store):
+        self.store = store
+        # pages are added in slug order, so consecutive rows share their pages
+        self.last_parent = None
+
+    def add(self, path, reference, entry):
+        conn = self.store.conn
+        parent = path.rsplit("/", 1)[0]
+        if parent != self.last_parent:
+            parts = parent.split("/")
+            conn.executemany(
+                "INSERT OR IGNORE INTO page (path, parent, name) VALUES (?, ?, ?)",
+                [
+                    ("/".join(parts[: n + 1]), "/".join(parts[:n]), parts[n])
+                    for n in range(len(parts))
+                ],
+            )
+            self.last_parent = parent
+        return (
+            conn.execute(
+                f"INSERT OR IGNORE INTO page_entry (path, sort_key, {ENTRY_FIELDS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [parent, encode_sort_key(reference)] + entry.state(),
+            ).rowcount
+            == 1
+        )
+
+    def remove(self, path, reference):
+        conn = self.store.conn
+        parent = path.rsplit("/", 1)[0]
+        if not conn.execute(
+            "DELETE FROM page_entry WHERE path = ? AND reference = ?",
+            (parent, reference),
+        ).rowcount:
+            return False
+
+        # remove the pages left without entries or directories
+        self.last_parent = None
+        while parent and StoredPage(self.store, parent).empty():
+            conn.execute("DELETE FROM page WHERE path = ?", (parent,))
+            parent = parent.rsplit("/", 1)[0] if "/" in parent else ""
+        return True
+
+    def find(self, path):
+        if (
+            self.store.conn.execute(
+                "SELECT 1 FROM page WHERE path = ?", (path,)
+            ).fetchone()
+            is None
+        ):
+            return None
+        return StoredPage(self.store, path)
+
+    def state(self, path=""):
+        children = self.store.conn.execute(
+            "SELECT path, name FROM page WHERE parent = ? ORDER BY rowid", (path,)
+        ).fetchall()
+        return {
+            "entries": [
+                entry.state() for entry in StoredPage(self.store, path).entries.values()
+            ],
+            "children": {name: self.state(child_path) for child_path, name in children},
+        }
+
+    def walk(self, path=""):
+        # pages in the same order as a SlugTrie, each listed before its directories
+        children = self.store.conn.execute(
+            "SELECT path FROM page WHERE parent = ? ORDER BY rowid", (path,)
+        ).fetchall()
+        for (child_path,) in children:
+            yield child_path, StoredPage(self.store, child_path)
+            yield from self.walk(child_path)
+
+
+class StoredPage:
+    __slots__ = ("store", "path")
+
+    def __init__(self, store, path):
+        self.store = store
+        self.path = path
+
+    @property
+    def entries(self):
+        return {
+            values[0]: IndexEntry(*values)
+            for values in self.store.conn.execute(
+                f"SELECT {ENTRY_FIELDS} FROM page_entry WHERE path = ? ORDER BY rowid",
+                (self.path,),
+            )
+        }
+
+    def items(self, extra=()):
+        return StoredPageItems(self, extra)
+
+    def directories(self):
+        return [
+            name
+            for name, in self.store.conn.execute(
+                "SELECT name FROM page WHERE parent = ? AND name NOT IN"
+                " (SELECT reference FROM page_entry WHERE path = ?) ORDER BY rowid",
+                (self.path, self.path),
+            )
+        ]
+
+    def empty(self):
+        conn = self.store.conn
+        return (
+            conn.execute(
+                "SELECT 1 FROM page_entry WHERE path = ? LIMIT 1", (self.path,)
+            ).fetchone()
+            is None
+            and conn.execute(
+                "SELECT 1 FROM page WHERE parent = ? LIMIT 1", (self.path,)
+            ).fetchone()
+            is None
+        )
+
+
+class StoredPageItems:
+    # the entries of a StoredPage in natural order, read a row at a time, with
+    # extra entries, such as those of its directories, merged in
+
+    __slots__ = ("page", "extra")
+
+    def __init__(self, page, extra=()):
+        self.page = page
+        self.extra = sorted(
+            ((encode_sort_key(entry.reference), entry) for entry in extra),
+            key=itemgetter(0),
+        )
+
+    def __iter__(self):
+        cursor = self.page.store.conn.execute(
+            f"SELECT sort_key, {ENTRY_FIELDS} FROM page_entry WHERE path = ?"
+            " ORDER BY sort_key, rowid",
+            (self.page.path,),
+        )
+        entries = ((values[0], IndexEntry(*values[1:])) for values in cursor)
+        # entries come before extra entries of the same sort key
+        return (
+            entry for _, entry in heapq.merge(entries, self.extra, key=itemgetter(0))
+        )
+
+    def __len__(self):
+        return self.page.store.conn.execute(
+            "SELECT COUNT(*) FROM page_entry WHERE path = ?", (self.page.path,)
+        ).fetchone()[0] + len(self.extra)
@@ -0,0 +1,224 @@
+import logging
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# suffixes of the precompressed copies a CompressingWriter writes beside a file
+COMPRESSED_SUFFIXES = (".gz", ".br")
+
+
+class FileWriter:
+    # whether files land on the filesystem, and whether the writer can be
+    # recreated in each worker process with worker_writer()
+    writes_files = True
+    multiprocess = True
+
+    def __init__(self):
+        # directories already created, so each is only made once per run
+        self.directories = set()
+
+    def makedirs(self, directory):
+        if directory and directory not in self.directories:
+            os.makedirs(directory, exist_ok=True)
+            self.directories.add(directory)
+
+    def write(self, path, content):
+        path = str(path)
+        self.makedirs(os.path.dirname(path))
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with open(path, mode) as f:
+            logging.debug(f"writing {path}")
+            f.write(content)
+
+    def write_stream(self, path, chunks):
+        path = str(path)
+        self.makedirs(os.path.dirname(path))
+        chunks = iter(chunks)
+        first = next(chunks, "")
+        mode = "wb" if isinstance(first, bytes) else "w"
+        with open(path, mode) as f:
+            logging.debug(f"streaming {path}")
+            f.write(first)
+            for chunk in chunks:
+                f.write(chunk)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def worker_writer(self):
+        return FileWriter()
+
+
+class ThreadedWriter:
+    """
+    Hands writes to a pool of background threads. At most max_pending writes
+    are queued at once, and flush() waits for every queued write to land.
+    """
+
+    def __init__(self, writer=None, max_workers=4, max_pending=256):
+        self.writer = writer or FileWriter()
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        # notified as each write completes, once any error has been recorded
+        self.condition = threading.Condition()
+        self.pending = set()
+        self.errors = []
+
+    @property
+    def writes_files(self):
+        return self.writer.writes_files
+
+    @property
+    def multiprocess(self):
+        return self.writer.multiprocess
+
+    def write(self, path, content):
+        self.slots.acquire()
+        future = self.executor.submit(self.writer.write, path, content)
+        with self.condition:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+
+    def write_stream(self, path, chunks):
+        # chunks are produced by the caller, so are consumed on the calling thread
+        self.writer.write_stream(path, chunks)
+
+    def _done(self, future):
+        # a future wakes its waiters before running its callbacks, so flush()
+        # waits on the callbacks, rather than the futures, for their errors
+        with self.condition:
+            if future.exception():
+                self.errors.append(future.exception())
+            self.pending.discard(future)
+            self.condition.notify_all()
+        self.slots.release()
+
+    def flush(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.pending)
+        self.writer.flush()
+        if self.errors:
+            errors, self.errors = self.errors, []
+            raise errors[0]
+
+    def shutdown(self):
+        # stops the threads, leaving the writer wrapped open
+        self.flush()
+        self.executor.shutdown()
+
+    def close(self):
+        self.shutdown()
+        self.writer.close()
+
+    def worker_writer(self):
+        return ThreadedWriter(
+            self.writer.worker_writer(), self.max_workers, self.max_pending
+        )
+
+
+class GzipCompressor:
+    suffix = ".gz"
+
+    def __init__(self, level=9):
+        # gzip container with no timestamp, so unchanged content compresses the same
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    suffix = ".br"
+
+    def __init__(self, quality=11):
+        self.compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+COMPRESSORS = {"gz": GzipCompressor, "br": BrotliCompressor}
+
+
+def default_compress_formats():
+    return ["gz", "br"] if brotli else ["gz"]
+
+
+class CompressingWriter:
+    """
+    Writes a gzip and brotli compressed copy beside every file, compressed
+    from the content in memory, for static hosts which serve precompressed
+    files. Wrap in a ThreadedWriter to compress on a pool of threads.
+    """
+
+    def __init__(self, writer=None, formats=None):
+        self.writer = writer or FileWriter()
+        self.formats = list(formats or default_compress_formats())
+        for format in self.formats:
+            if format not in COMPRESSORS:
+                raise ValueError(f"unknown compression format {format}")
+            if format == "br" and not brotli:
+                raise ValueError("brotli compression requires the brotli package")
+
+    @property
+    def writes_files(self):
+        return self.writer.writes_files
+
+    @property
+    def multiprocess(self):
+        return self.writer.multiprocess
+
+    def compressors(self, path):
+        # files already compressed, such as a gzipped sitemap, are written as they are
+        if str(path).endswith(COMPRESSED_SUFFIXES):
+            return []
+        return [COMPRESSORS[format]() for format in self.formats]
+
+    def write(self, path, content):
+        self.writer.write(path, content)
+        data = content.encode("utf-8") if isinstance(content, str) else content
+        for compressor in self.compressors(path):
+            compressed = compressor.compress(data) + compressor.finish()
+            self.writer.write(f"{path}{compressor.suffix}", compressed)
+
+    def write_stream(self, path, chunks):
+        compressors = self.compressors(path)
+        compressed = [[] for _ in compressors]
+
+        def tee():
+            for chunk in chunks:
+                data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                for compressor, parts in zip(compressors, compressed):
+                    parts.append(compressor.compress(data))
+                yield chunk
+
+        self.writer.write_stream(path, tee())
+        for compressor, parts in zip(compressors, compressed):
+            parts.append(compressor.finish())
+            self.writer.write(f"{path}{compressor.suffix}", b"".join(parts))
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+
+    def worker_writer(self):
+        return CompressingWriter(self.writer.worker_writer(), self.formats)
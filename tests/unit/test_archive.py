@@ -0,0 +1,97 @@
+import io
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from digital_land_frontend.archive import (
+    ArchiveWriter,
+    SQLiteWriter,
+    TarWriter,
+    ZipWriter,
+    archive_handler,
+    extract,
+    open_archive,
+)
+
+
+@pytest.mark.parametrize(
+    "writer_class, filename",
+    [(ZipWriter, "docs.zip"), (TarWriter, "docs.tar"), (SQLiteWriter, "docs.db")],
+)
+def test_archive_round_trip(tmp_path, writer_class, filename):
+    docs = tmp_path / "docs"
+    with writer_class(tmp_path / filename, root=docs) as writer:
+        writer.write(docs / "index.html", "root")
+        writer.write(docs / "REF01" / "geometry.geojson", b"{}")
+        writer.write_stream(docs / "REF01" / "index.html", iter(["item ", "one"]))
+    # as when closed by a renderer inside the with block
+    writer.close()
+
+    archive = open_archive(tmp_path / filename)
+    assert dict(archive.items()) == {
+        "index.html": b"root",
+        "REF01/geometry.geojson": b"{}",
+        "REF01/index.html": b"item one",
+    }
+    assert archive.read("REF01/index.html") == b"item one"
+    assert archive.read("missing.html") is None
+    archive.close()
+
+    extract(tmp_path / filename, tmp_path / "extracted")
+    assert (tmp_path / "extracted" / "REF01" / "index.html").read_text() == "item one"
+
+
+def test_archive_writer_requires_add(tmp_path):
+    class NoAddWriter(ArchiveWriter):
+        pass
+
+    with pytest.raises(TypeError, match=r"abstract method"):
+        NoAddWriter(tmp_path / "docs.zip")
+
+
+def test_tar_writer_stream():
+    stream = io.BytesIO()
+    writer = TarWriter(stream, root="docs", compression="gz")
+    writer.write("docs/index.html", "root")
+    writer.close()
+
+    assert stream.getvalue()[:2] == b"\x1f\x8b"
+
+
+def test_tar_reader_reads_from_threads(tmp_path):
+    contents = {f"REF{n:02d}/index.html": f"item {n} " * 1000 for n in range(20)}
+    with TarWriter(tmp_path / "docs.tar", root=tmp_path) as writer:
+        for name, content in contents.items():
+            writer.write(tmp_path / name, content)
+
+    archive = open_archive(tmp_path / "docs.tar")
+    names = list(contents) * 10
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        read = list(executor.map(archive.read, names))
+    archive.close()
+
+    assert read == [contents[name].encode("utf-8") for name in names]
+
+
+def test_archive_handler(tmp_path):
+    with ZipWriter(tmp_path / "docs.zip", root=tmp_path) as writer:
+        writer.write(tmp_path / "REF01" / "index.html", "item one")
+
+    archive = open_archive(tmp_path / "docs.zip")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), archive_handler(archive))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/REF01/") as response:
+            assert response.read() == b"item one"
+            assert response.headers["Content-Type"] == "text/html"
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{url}/REF02/")
+    finally:
+        server.shutdown()
+        server.server_close()
+        archive.close()
@@ -0,0 +1,37 @@
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+from digital_land_frontend.jinja_filters.mappers import GeneralOrganisationMapper
+
+BENCHMARKS = Path(__file__).parents[2] / "benchmarks"
+
+
+@pytest.fixture()
+def render_benchmark(monkeypatch):
+    # the benchmark loads synthetic organisations into the shared organisation
+    # mapper, so restore its state for later tests
+    organisations = GeneralOrganisationMapper.organisations
+    for name in ["mapping", "slug", "to_slug_mapping"]:
+        monkeypatch.setattr(organisations, name, dict(getattr(organisations, name)))
+    monkeypatch.setattr(organisations, "loaded", organisations.loaded)
+
+    spec = importlib.util.spec_from_file_location(
+        "render_benchmark", BENCHMARKS / "render.py"
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("nested", [False, True])
+def test_render_benchmark_scenario(render_benchmark, tmp_path, nested):
+    # keeps the benchmark working as the renderer changes
+    result = render_benchmark.run_scenario(
+        {"entities": 20, "geometry": True, "nested": nested, "grouped": True},
+        tmp_path,
+    )
+
+    assert result["entities_per_second"] > 0
+    assert result["files"] >= 41
@@ -0,0 +1,90 @@
+import json
+import sqlite3
+
+import pytest
+
+from digital_land_frontend.build import build, parse_shard, summary
+
+
+def create_dataset(path, pipeline_name, count):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE entry (id INTEGER PRIMARY KEY, slug TEXT, data TEXT, resource TEXT, line_num INTEGER)"
+    )
+    for n in range(count):
+        slug = f"/{pipeline_name}/REF{n}"
+        conn.execute(
+            "INSERT INTO entry (slug, data, resource, line_num) VALUES (?, ?, ?, ?)",
+            (
+                slug,
+                json.dumps({"slug": slug, pipeline_name: f"REF{n}", "name": f"{n}"}),
+                "abc123",
+                n,
+            ),
+        )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture()
+def pipelines(tmp_path, monkeypatch):
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "row.html").write_text("{{ urlRoot }}{{ row['name'] }}")
+    (tmp_path / "templates" / "index.html").write_text("{{ count }}")
+    monkeypatch.chdir(tmp_path)
+
+    pipelines = []
+    for pipeline_name, count in [("small", 2), ("large", 20)]:
+        create_dataset(tmp_path / f"{pipeline_name}.sqlite3", pipeline_name, count)
+        pipelines.append(
+            {
+                "pipeline_name": pipeline_name,
+                "schema": pipeline_name,
+                "typology": "category",
+                "key_field": pipeline_name,
+                "group_field": None,
+                "dataset_path": str(tmp_path / f"{pipeline_name}.sqlite3"),
+            }
+        )
+    return pipelines
+
+
+@pytest.mark.parametrize("jobs", [None, 2])
+def test_build(pipelines, tmp_path, jobs):
+    results = build(pipelines, jobs=jobs, preload=False, docs=tmp_path / "docs")
+
+    assert {result["pipeline"]: result["entities"] for result in results} == {
+        "small": 2,
+        "large": 20,
+    }
+    assert (tmp_path / "docs" / "small" / "REF1" / "index.html").read_text() == (
+        "/small/1"
+    )
+    assert (tmp_path / "docs" / "large" / "index.html").read_text() == "20"
+    assert "large" in summary(results)
+
+
+def test_build_reports_failed_pipelines(pipelines, tmp_path):
+    pipelines[0]["dataset_path"] = str(tmp_path / "missing.sqlite3")
+    results = build(pipelines, preload=False, docs=tmp_path / "docs")
+
+    errors = {result["pipeline"]: result.get("error") for result in results}
+    assert errors["small"].startswith("OperationalError")
+    assert errors["large"] is None
+
+
+def test_sharded_build(pipelines, tmp_path):
+    build(pipelines, preload=False, docs=tmp_path / "expected")
+    for number in [1, 2, 3]:
+        build(pipelines, preload=False, docs=tmp_path / "docs", shard=(number, 3))
+    assert not (tmp_path / "docs" / "large" / "index.html").exists()
+    build(pipelines, preload=False, docs=tmp_path / "docs", merge_shards=3)
+
+    def pages(docs):
+        return {
+            str(path.relative_to(docs)): path.read_text()
+            for path in docs.rglob("*.html")
+        }
+
+    assert pages(tmp_path / "docs") == pages(tmp_path / "expected")
+    assert parse_shard("2/3") == (2, 3)
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from digital_land_frontend.geometry import (
+    feature_properties,
+    geojson_feature,
+    wkt_to_geojson,
+    wkt_to_json_geometry,
+    wkts_to_geojson,
+)
+
+POLYGON = (
+    "POLYGON ((-0.1234567890123 51.5, -0.2 51.2, -0.3 51.1, -0.1234567890123 51.5))"
+)
+
+
+@pytest.mark.parametrize(
+    "wkt",
+    [
+        "POINT (-1.5 52.25)",
+        POLYGON,
+        "MULTIPOLYGON (((0 0, 1 0, 1 1, 0 0)), ((2 2, 3 2, 3 3, 2 2)))",
+    ],
+)
+def test_wkt_to_geojson_matches_shapely_mapping(wkt):
+    expected = json.loads(json.dumps(wkt_to_json_geometry(wkt)))
+
+    assert json.loads(wkt_to_geojson(wkt)) == expected
+    assert [json.loads(geometry) for geometry in wkts_to_geojson([wkt, wkt])] == [
+        expected,
+        expected,
+    ]
+
+
+def test_geojson_feature():
+    row = {"slug": "/dataset-name/REF01", "name": "item-one", "geometry": POLYGON}
+
+    assert json.loads(geojson_feature(row, "geometry")) == {
+        "type": "Feature",
+        "geometry": {
+            "type": "Polygon",
+            "coordinates": [
+                [
+                    [-0.1234567890123, 51.5],
+                    [-0.2, 51.2],
+                    [-0.3, 51.1],
+                    [-0.1234567890123, 51.5],
+                ]
+            ],
+        },
+        "properties": row,
+    }
+
+
+def test_wkt_to_geojson_with_precision():
+    assert json.loads(wkt_to_geojson(POLYGON, precision=2))["coordinates"] == [
+        [[-0.12, 51.5], [-0.2, 51.2], [-0.3, 51.1], [-0.12, 51.5]]
+    ]
+    assert wkt_to_json_geometry(POLYGON, precision=3)["coordinates"][0][0][0] == -0.123
+
+
+def test_feature_properties():
+    row = {"slug": "/dataset-name/REF01", "name": "item-one", "geometry": POLYGON}
+
+    assert feature_properties(row) == row
+    assert feature_properties(row, properties=["name", "missing"]) == {
+        "name": "item-one"
+    }
+    assert feature_properties(row, exclude=["geometry", "point"]) == {
+        "slug": "/dataset-name/REF01",
+        "name": "item-one",
+    }
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from digital_land_frontend.index import (
+    IndexEntry,
+    IndexItems,
+    SlugTrie,
+    natural_sort_key,
+)
+
+
+def test_index_entry_to_dict():
+    entry = IndexEntry("REF/04", "item-four", slug="/dataset-name/org-one/REF-04")
+
+    assert entry.to_dict("dataset-name/org-one") == {
+        "reference": "REF/04",
+        "text": "item-four",
+        "href": "./REF-04",
+        "end-date": "",
+    }
+    assert IndexEntry("REF01", "item-one", href="./REF01").to_dict()["href"] == (
+        "./REF01"
+    )
+
+
+def test_index_entry_requires_href_or_slug():
+    with pytest.raises(ValueError, match=r"requires href or slug"):
+        IndexEntry("REF01", "item-one")
+
+
+def test_natural_sort_key():
+    references = ["REF10", "REF2", "ref1", "2", "REF2a", "10"]
+
+    assert sorted(references, key=natural_sort_key) == [
+        "2",
+        "10",
+        "REF2",
+        "REF2a",
+        "REF10",
+        "ref1",
+    ]
+
+
+def test_index_items_are_read_in_natural_order():
+    items = IndexItems()
+    for reference, text in [
+        ("REF10", "ten"),
+        ("REF2", "two"),
+        ("REF02", "also two"),
+        ("REF1", "one"),
+    ]:
+        items.append(IndexEntry(reference, text, href=f"./{reference}"))
+    assert [entry.text for entry in items] == ["one", "two", "also two", "ten"]
+
+    # appending after reading keeps equal references in the order added
+    items.append(IndexEntry("REF002", "two again", href="./REF002"))
+    assert [entry.text for entry in items] == [
+        "one",
+        "two",
+        "also two",
+        "two again",
+        "ten",
+    ]
+    assert len(items) == 5
+
+
+def test_slug_trie():
+    trie = SlugTrie()
+    for path, reference in [
+        ("org-one/area/REF01", "REF01"),
+        ("org-one/area/REF02", "REF02"),
+        ("org-one/area/REF01", "REF01"),
+        ("org-one/REF03", "REF03"),
+        ("org-two/area/REF04", "REF04"),
+    ]:
+        trie.add(path, reference, IndexEntry(reference, None, href=f"./{reference}"))
+
+    pages = {path: node for path, node in trie.walk()}
+    assert list(pages) == ["org-one", "org-one/area", "org-two", "org-two/area"]
+    assert list(pages["org-one/area"].entries) == ["REF01", "REF02"]
+    assert list(pages["org-one"].entries) == ["REF03"]
+    assert pages["org-one"].directories() == ["area"]
+    assert len(pages["org-one"]) == 2
+    assert len(trie) == 2
+
+    restored = SlugTrie.from_state(json.loads(json.dumps(trie.state())))
+    assert restored.state() == trie.state()
+    assert restored.children["org-one"].entries["REF03"].href == "./REF03"
+
+    assert trie.find("org-one/area") is pages["org-one/area"]
+    assert trie.find("org-three") is None
+    assert trie.remove("org-two/area/REF04", "REF04")
+    assert not trie.remove("org-two/area/REF04", "REF04")
+    assert [path for path, _ in trie.walk()] == ["org-one", "org-one/area"]
@@ -0,0 +1,48 @@
+import pytest
+
+from digital_land_frontend.jinja import TemplateCodeCache, setup_jinja
+from digital_land_frontend.render import JinjaRenderer
+
+
+@pytest.fixture()
+def templates_dir(tmp_path, monkeypatch):
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "row.html").write_text("{{ urlRoot }}{{ row }}")
+    (tmp_path / "templates" / "index.html").write_text("{{ count }}")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def not_compiled(*args, **kwargs):
+    raise AssertionError("template compiled again")
+
+
+def test_bytecode_cache_directory(templates_dir):
+    cache = templates_dir / "cache"
+    setup_jinja(bytecode_cache=cache).get_template("row.html")
+    assert list(cache.glob("*.cache"))
+
+    env = setup_jinja(bytecode_cache=cache)
+    env.compile = not_compiled
+    assert env.get_template("row.html").render(row="one") == "one"
+
+    # edited templates are compiled again
+    (templates_dir / "templates" / "row.html").write_text("{{ row }}!")
+    template = setup_jinja(bytecode_cache=cache).get_template("row.html")
+    assert template.render(row="one") == "one!"
+
+
+@pytest.mark.parametrize("bytecode_cache", [None, TemplateCodeCache()])
+def test_shared_environment(templates_dir, bytecode_cache):
+    env = setup_jinja(bytecode_cache=bytecode_cache)
+    one = JinjaRenderer("/one/", None, None, env=env)
+    env.compile = not_compiled
+    two = JinjaRenderer("/two/", None, None, env=env)
+
+    one.render_row(str(templates_dir / "one.html"), row="a")
+    two.render_row(str(templates_dir / "two.html"), row="b")
+
+    assert (templates_dir / "one.html").read_text() == "/one/a"
+    assert (templates_dir / "two.html").read_text() == "/two/b"
+    assert "urlRoot" not in env.globals
+    assert not env.trim_blocks
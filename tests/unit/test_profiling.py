@@ -0,0 +1,30 @@
+from digital_land_frontend.profiling import NULL_PROFILER, Profiler
+
+
+def test_profiler():
+    profiler = Profiler(slowest=2)
+    for n in range(3):
+        with profiler.phase("template"):
+            pass
+        profiler.page(f"REF0{n}", n)
+
+    worker = Profiler(slowest=2)
+    with worker.phase("template"):
+        pass
+    worker.page("REF10", 1.5)
+    profiler.update(worker.drain())
+
+    report = profiler.report()
+    assert report["phases"]["template"]["calls"] == 4
+    assert report["slowest"] == [
+        {"path": "REF02", "seconds": 2},
+        {"path": "REF10", "seconds": 1.5},
+    ]
+    assert worker.report() == {"phases": {}, "slowest": []}
+    assert "REF10" in profiler.summary()
+
+
+def test_null_profiler():
+    with NULL_PROFILER.phase("template"):
+        pass
+    NULL_PROFILER.update(NULL_PROFILER.drain())
@@ -0,0 +1,143 @@
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from digital_land_frontend.readers import (
+    diff_entries,
+    in_shard,
+    read_entities,
+    read_entries,
+    read_rows,
+)
+
+
+def create_dataset(path, entries):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE entry (id INTEGER PRIMARY KEY, slug TEXT, data TEXT, resource TEXT, line_num INTEGER)"
+    )
+    for slug, line_num, name in entries:
+        conn.execute(
+            "INSERT INTO entry (slug, data, resource, line_num) VALUES (?, ?, ?, ?)",
+            (slug, json.dumps({"slug": slug, "name": name}), "abc123", line_num),
+        )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture()
+def dataset_path(tmp_path):
+    return create_dataset(
+        tmp_path / "dataset.sqlite3",
+        [
+            ("/dataset-name/REF02", 1, "item-two"),
+            ("/dataset-name/REF01", 3, "item-one-updated"),
+            ("/dataset-name/REF01", 2, "item-one"),
+        ],
+    )
+
+
+def test_read_entries_groups_entries_by_slug(dataset_path):
+    entries = [
+        (slug, [(entry.data["name"], entry.line_num) for entry in group])
+        for slug, group in read_entries(dataset_path, batch_size=2)
+    ]
+
+    # in the order they were added, not the order of their line numbers
+    assert entries == [
+        ("/dataset-name/REF01", [("item-one-updated", 3), ("item-one", 2)]),
+        ("/dataset-name/REF02", [("item-two", 1)]),
+    ]
+
+
+def test_read_entities_keeps_the_order_entries_were_added(tmp_path):
+    path = tmp_path / "dataset.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE entry (id INTEGER PRIMARY KEY, slug TEXT, data TEXT, resource TEXT, line_num INTEGER)"
+    )
+    for name, resource, line_num in [("old-name", "old", 5), ("new-name", "new", 1)]:
+        data = {"slug": "/dataset-name/REF01", "name": name, "entry-date": "2021-01-01"}
+        conn.execute(
+            "INSERT INTO entry (slug, data, resource, line_num) VALUES (?, ?, ?, ?)",
+            (data["slug"], json.dumps(data), resource, line_num),
+        )
+    conn.commit()
+    conn.close()
+
+    (entity,) = read_entities(path, "schema-name")
+    assert [entry.resource for entry in entity.entries] == ["old", "new"]
+    assert entity.snapshot()["name"] == "new-name"
+
+
+def test_read_entities(dataset_path):
+    entities = list(read_entities(dataset_path, "schema-name"))
+
+    assert len(entities) == 2
+    assert [entity.schema for entity in entities] == ["schema-name", "schema-name"]
+
+
+def test_diff_entries(dataset_path, tmp_path):
+    previous_path = create_dataset(
+        tmp_path / "previous.sqlite3",
+        [
+            ("/dataset-name/REF00", 1, "item-zero"),
+            ("/dataset-name/REF01", 2, "item-one"),
+            ("/dataset-name/REF02", 1, "item-two"),
+        ],
+    )
+
+    changes = [
+        (slug, old and len(old), new and len(new))
+        for slug, old, new in diff_entries(previous_path, dataset_path, batch_size=2)
+    ]
+
+    assert changes == [
+        ("/dataset-name/REF00", 1, None),
+        ("/dataset-name/REF01", 1, 2),
+    ]
+
+
+ROWS = [
+    {"slug": f"/dataset-name/REF{n}", "dataset-name": f"REF{n}", "name": ""}
+    for n in range(10)
+]
+
+
+def test_read_rows_from_csv(tmp_path):
+    path = tmp_path / "dataset-name.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["slug", "dataset-name", "name"])
+        writer.writeheader()
+        writer.writerows(ROWS)
+
+    rows = list(read_rows(path))
+    assert [row.snapshot() for row in rows] == ROWS
+    assert rows[0].all_fields() == ["slug", "dataset-name", "name"]
+    assert rows[0].change_history() == []
+
+    assert [row.snapshot() for row in read_rows(path, start=8)] == ROWS[8:]
+    assert [row.snapshot() for row in read_rows(path, shard=(2, 3))] == [
+        row for row in ROWS if in_shard(row["slug"], (2, 3))
+    ]
+
+    with pytest.raises(ValueError):
+        list(read_rows(tmp_path / "dataset-name.json"))
+
+
+def test_read_rows_from_parquet(tmp_path):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    path = tmp_path / "dataset-name.parquet"
+    table = pyarrow.Table.from_pylist(
+        [dict(row, name=None, count=n) for n, row in enumerate(ROWS)]
+    )
+    pyarrow.parquet.write_table(table, path, row_group_size=3)
+
+    assert [row.snapshot() for row in read_rows(path, batch_size=3)] == [
+        dict(row, count=str(n)) for n, row in enumerate(ROWS)
+    ]
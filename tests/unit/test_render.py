@@ -1,13 +1,23 @@
+import csv
+import gzip
+import json
+import os
+import re
+import sqlite3
+import tracemalloc
 from collections import OrderedDict
+from pathlib import Path
 
 import pytest
 from digital_land.model.entity import Entity
 from digital_land.model.entry import Entry
 from digital_land.specification import Specification
 
+from digital_land_frontend.archive import ZipWriter, open_archive
 from digital_land_frontend.render import (
     Renderer,
     generate_download_link,
+    paginate_groups,
     slug_to_breadcrumb,
     slug_to_relative_href,
 )
@@ -27,6 +37,22 @@ class SpyRenderer:
         self.index_pages_rendered[path] = kwargs
 
 
+class FileSpyRenderer(SpyRenderer):
+    def render_row(self, path, **kwargs):
+        super().render_row(path, **kwargs)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(kwargs["row"]["slug"])
+
+
+class NullRenderer:
+    # renders nothing, so holds nothing of the pages given to it
+    def render_row(self, path, **kwargs):
+        pass
+
+    def render_index(self, path, **kwargs):
+        pass
+
+
 @pytest.fixture()
 def _dataset_reader():
     # deliberately out of order to test renderer sorting logic
@@ -224,7 +250,6 @@ def test_render_with_index_grouping_and_sub_indexes(dataset_multi_slug_reader):
                 "end-date": "2021-02-02",
             },
         ],
-        "references": {"REF01", "REF03", "REF/04"},
     }
 
     assert spy_renderer.index_pages_rendered["docs/org-two/index.html"] == {
@@ -240,7 +265,6 @@ def test_render_with_index_grouping_and_sub_indexes(dataset_multi_slug_reader):
                 "end-date": "",
             },
         ],
-        "references": {"REF02"},
     }
 
 
@@ -392,6 +416,968 @@ def test_render_with_no_index_grouping(dataset_simple_slug_reader):
     }
 
 
+def test_render_with_jobs_matches_serial(dataset_multi_slug_reader, tmp_path):
+    renderers = {}
+    for name, jobs in [("serial", None), ("parallel", 2)]:
+        renderers[name] = FileSpyRenderer()
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field="organisation",
+            docs=tmp_path / name,
+            renderer=renderers[name],
+            jobs=jobs,
+        ).render(dataset_multi_slug_reader)
+
+    # row pages are rendered in the worker processes
+    assert renderers["parallel"].row_pages_rendered == {}
+    for path in renderers["serial"].row_pages_rendered:
+        relative_path = os.path.relpath(path, tmp_path / "serial")
+        assert (tmp_path / "parallel" / relative_path).read_text() == Path(
+            path
+        ).read_text()
+
+    def relative_index_pages(name):
+        return {
+            os.path.relpath(path, tmp_path / name): kwargs
+            for path, kwargs in renderers[name].index_pages_rendered.items()
+        }
+
+    assert len(relative_index_pages("parallel")) == 3
+    assert relative_index_pages("parallel") == relative_index_pages("serial")
+
+
+@pytest.fixture()
+def templates_dir(tmp_path, monkeypatch):
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "row.html").write_text("{{ row['name'] }}")
+    (tmp_path / "templates" / "index.html").write_text("{{ count }}")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_incremental_render(_dataset_reader, templates_dir):
+    def render(data):
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field=None,
+            incremental=True,
+        ).render(
+            Entity(
+                [
+                    Entry(
+                        dict(row, slug=f"/dataset-name/{row['dataset-name']}"),
+                        "abc123",
+                        idx,
+                    )
+                ],
+                "conservation-area",
+            )
+            for idx, row in enumerate(data)
+            if "/" not in row["dataset-name"]
+        )
+
+    docs = templates_dir / "docs"
+    render(_dataset_reader)
+    assert (docs / "REF01" / "index.html").read_text() == "item-one"
+    assert (docs / "index.html").read_text() == "3"
+
+    (docs / "REF02" / "index.html").write_text("not rendered")
+    (docs / "REF03" / "index.html").write_text("not written")
+    data = {row["dataset-name"]: dict(row) for row in _dataset_reader[1:]}
+    data["REF03"]["end-date"] = "2021-03-03"
+    render(data.values())
+
+    # unchanged inputs are not rendered, unchanged output is not written
+    assert (docs / "REF02" / "index.html").read_text() == "not rendered"
+    assert (docs / "REF03" / "index.html").read_text() == "not written"
+
+    data["REF02"]["name"] = "item-2"
+    render(data.values())
+    assert (docs / "REF02" / "index.html").read_text() == "item-2"
+    assert (docs / "index.html").read_text() == "2"
+
+    # pages for entities no longer in the dataset are removed
+    assert not (docs / "REF01").exists()
+
+
+def test_incremental_render_entity_history(_dataset_reader, templates_dir):
+    (templates_dir / "templates" / "row.html").write_text(
+        "{% for entry in entity.entries %}{{ entry.resource }} {% endfor %}"
+    )
+    row = dict(_dataset_reader[0], slug="/dataset-name/REF01")
+
+    def render(resources):
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field=None,
+            incremental=True,
+        ).render(
+            [
+                Entity(
+                    [
+                        Entry(row, resource, idx)
+                        for idx, resource in enumerate(resources)
+                    ],
+                    "conservation-area",
+                )
+            ]
+        )
+
+    render(["abc123"])
+    # an entry which doesn't change the snapshot still changes the history
+    render(["abc123", "def456"])
+    assert (templates_dir / "docs" / "REF01" / "index.html").read_text() == (
+        "abc123 def456 "
+    )
+
+
+def test_incremental_render_missing_geometry(templates_dir):
+    def render():
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field=None,
+            incremental=True,
+        ).render(
+            [
+                Entity(
+                    [
+                        Entry(
+                            {
+                                "dataset-name": "REF01",
+                                "name": "item-one",
+                                "slug": "/dataset-name/REF01",
+                                "geometry": "POINT (-1.23456 52.34567)",
+                            },
+                            "abc123",
+                            1,
+                        )
+                    ],
+                    "conservation-area",
+                )
+            ]
+        )
+
+    geometry = templates_dir / "docs" / "REF01" / "geometry.geojson"
+    render()
+    geometry.unlink()
+
+    # the row page is unchanged, but the geometry it links to is written again
+    render()
+    assert json.loads(geometry.read_text())["type"] == "Feature"
+
+
+def test_render_reads_templates_only_when_incremental(
+    dataset_simple_slug_reader, templates_dir
+):
+    renderer = Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field=None,
+    )
+    renderer.render(dataset_simple_slug_reader)
+
+    assert not hasattr(renderer.renderer, "_template_version")
+
+
+@pytest.mark.parametrize("incremental", [False, True])
+def test_render_stream(dataset_simple_slug_reader, templates_dir, incremental):
+    (templates_dir / "templates" / "index.html").write_text(
+        "{{ count }}{% for item in items %} {{ item.href }}{% endfor %}"
+    )
+    for stream in [False, True]:
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field=None,
+            docs=templates_dir / f"docs-{stream}",
+            incremental=incremental,
+            stream=stream,
+        ).render(dataset_simple_slug_reader)
+
+    pages = sorted((templates_dir / "docs-False").rglob("index.html"))
+    assert len(pages) == 5
+    for page in pages:
+        streamed_page = (
+            templates_dir / "docs-True" / page.relative_to(templates_dir / "docs-False")
+        )
+        assert streamed_page.read_text() == page.read_text()
+    assert (templates_dir / "docs-True" / "index.html").read_text() == (
+        "4 ./REF01 ./REF02 ./REF03 ./REF-04"
+    )
+
+
+def test_render_compress(dataset_simple_slug_reader, templates_dir):
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field=None,
+        compress=["gz"],
+    ).render(dataset_simple_slug_reader)
+
+    docs = templates_dir / "docs"
+    assert gzip.decompress((docs / "REF01" / "index.html.gz").read_bytes()) == (
+        b"item-one"
+    )
+    assert gzip.decompress((docs / "index.html.gz").read_bytes()) == b"4"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_incremental_render_compress(dataset_simple_slug_reader, templates_dir, jobs):
+    def render(compress):
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field=None,
+            incremental=True,
+            compress=compress,
+            jobs=jobs,
+        ).render(dataset_simple_slug_reader)
+
+    docs = templates_dir / "docs"
+    render(None)
+    assert not (docs / "REF01" / "index.html.gz").exists()
+
+    # compressed copies are written for pages which are otherwise unchanged
+    render(["gz"])
+    assert gzip.decompress((docs / "REF01" / "index.html.gz").read_bytes()) == (
+        b"item-one"
+    )
+    assert gzip.decompress((docs / "index.html.gz").read_bytes()) == b"4"
+
+    # and removed when no longer compressed
+    render(None)
+    assert (docs / "REF01" / "index.html").exists()
+    assert not (docs / "REF01" / "index.html.gz").exists()
+    assert not (docs / "index.html.gz").exists()
+
+
+def test_render_to_archive(dataset_simple_slug_reader, templates_dir):
+    docs = templates_dir / "docs"
+    with ZipWriter(templates_dir / "docs.zip", root=docs) as writer:
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field=None,
+            writer=writer,
+        ).render(dataset_simple_slug_reader)
+
+    assert not docs.exists()
+    archive = open_archive(templates_dir / "docs.zip")
+    assert archive.read("REF01/index.html") == b"item-one"
+    assert archive.read("index.html") == b"4"
+    archive.close()
+
+    with pytest.raises(ValueError):
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            writer=ZipWriter(templates_dir / "other.zip", root=docs),
+            incremental=True,
+        )
+
+    # files outside the root of the archive would be stored as ../
+    with pytest.raises(ValueError, match=r"outside the archive root"):
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            docs=templates_dir / "out",
+            writer=ZipWriter(templates_dir / "another.zip", root=docs),
+        )
+
+
+def synthetic_entities(count):
+    for idx in range(count):
+        row = {
+            "dataset-name": f"REF{idx}",
+            "name": f"item-{idx}",
+            "slug": f"/dataset-name/REF{idx}",
+            "organisation": "org-one",
+            "notes": f"{idx:0500d}",
+            "end-date": "",
+            "entry-date": "2021-01-01",
+        }
+        yield Entity([Entry(row, "abc123", idx)], "conservation-area")
+
+
+def render_peak(count, tmp_path):
+    renderer = Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field=None,
+        docs=tmp_path / str(count),
+        renderer=NullRenderer(),
+    )
+    tracemalloc.start()
+    try:
+        renderer.render(synthetic_entities(count))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def test_render_memory_per_entity(tmp_path):
+    # rows are not held once rendered, only a compact index entry for each,
+    # so the peak grows by much less per entity than the size of its row
+    small, large = render_peak(1000, tmp_path), render_peak(5000, tmp_path)
+
+    assert (large - small) / 4000 < 1500
+
+
+def test_render_leaves_writer_open(dataset_simple_slug_reader, tmp_path):
+    # a writer given is shared by the renderers of a build, and closed by it
+    with ZipWriter(tmp_path / "docs.zip", root=tmp_path) as writer:
+        for name in ["one", "two"]:
+            Renderer(
+                name,
+                "schema-name",
+                "typology-name",
+                "dataset-name",
+                None,
+                SPECIFICATION,
+                group_field=None,
+                docs=tmp_path / name,
+                renderer=SpyRenderer(),
+                writer=writer,
+                compress=["gz"],
+                search_index=True,
+            ).render(dataset_simple_slug_reader)
+
+    archive = open_archive(tmp_path / "docs.zip")
+    assert archive.read("one/search/index.json") is not None
+    assert archive.read("two/search/index.json.gz") is not None
+    archive.close()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_render_profile(dataset_simple_slug_reader, templates_dir, jobs):
+    renderer = Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field=None,
+        jobs=jobs,
+        profile=templates_dir / "profile.json",
+    )
+    renderer.render(dataset_simple_slug_reader)
+
+    report = json.loads((templates_dir / "profile.json").read_text())
+    assert report["phases"]["snapshot"]["calls"] == 4
+    assert report["phases"]["template"]["calls"] == 5
+    assert report["phases"]["total"]["calls"] == 1
+    assert {page["path"] for page in report["slowest"]} == {
+        "REF01",
+        "REF02",
+        "REF03",
+        "REF-04",
+    }
+
+
+def test_render_geometry_options(tmp_path):
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field=None,
+        docs=tmp_path,
+        renderer=SpyRenderer(),
+        geometry_precision=2,
+        geometry_properties=["dataset-name", "name", "geometry"],
+        geometry_drop_wkt=True,
+    ).render(
+        [
+            Entity(
+                [
+                    Entry(
+                        {
+                            "dataset-name": "REF01",
+                            "name": "item-one",
+                            "slug": "/dataset-name/REF01",
+                            "geometry": "POINT (-1.23456 52.34567)",
+                        },
+                        "abc123",
+                        1,
+                    )
+                ],
+                "conservation-area",
+            )
+        ]
+    )
+
+    assert json.loads((tmp_path / "REF01" / "geometry.geojson").read_text()) == {
+        "type": "Feature",
+        "geometry": {"type": "Point", "coordinates": [-1.23, 52.35]},
+        "properties": {"dataset-name": "REF01", "name": "item-one"},
+    }
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_render_spatial_bundle(_dataset_reader, tmp_path, jobs):
+    spy_renderer = SpyRenderer()
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field="organisation",
+        docs=tmp_path,
+        renderer=spy_renderer,
+        spatial_bundle=True,
+        jobs=jobs,
+    ).render(
+        [
+            Entity(
+                [
+                    Entry(
+                        dict(
+                            row,
+                            slug=f"/dataset-name/{row['organisation']}/{row['dataset-name'].replace('/', '-')}",
+                            geometry=f"POINT (-1.{idx} 52.{idx})",
+                        ),
+                        "abc123",
+                        idx,
+                    )
+                ],
+                "conservation-area",
+            )
+            for idx, row in enumerate(_dataset_reader)
+        ]
+    )
+
+    index = json.loads((tmp_path / "geometry" / "index.json").read_text())
+    assert index["count"] == 4
+    assert index["bbox"] == [-1.3, 52.0, -1.0, 52.3]
+
+    features = (tmp_path / "geometry" / index["features"]).read_bytes()
+    offset, length = index["chunks"][0][4:6]
+    hrefs = {
+        json.loads(line)["properties"]["href"]
+        for line in features[offset : offset + length].splitlines()
+    }
+    assert "/dataset-name/org-one/REF01" in hrefs
+    assert len(hrefs) == 4
+
+    group_index = json.loads(
+        (tmp_path / "geometry" / "org-two" / "index.json").read_text()
+    )
+    assert group_index["count"] == 1
+
+    root_kwargs = spy_renderer.index_pages_rendered[str(tmp_path / "index.html")]
+    assert root_kwargs["geometry_bundle_url"] == "./geometry/index.json"
+    assert {g["geometry_bundle_url"] for g in root_kwargs["groups"].values()} == {
+        "./geometry/org-one/index.json",
+        "./geometry/org-two/index.json",
+    }
+
+
+def test_render_paginated_index(dataset_multi_slug_reader, tmp_path):
+    spy_renderer = SpyRenderer()
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field=None,
+        docs=tmp_path,
+        renderer=spy_renderer,
+        index_page_size=2,
+        search_index=True,
+    ).render(dataset_multi_slug_reader)
+
+    # links from the pages after the first are relative to their directory
+    first = spy_renderer.index_pages_rendered[str(tmp_path / "index.html")]
+    second = spy_renderer.index_pages_rendered[str(tmp_path / "page/2/index.html")]
+    assert first["search_index_url"] == "./search/index.json"
+    assert second["search_index_url"] == "../../search/index.json"
+
+    first = spy_renderer.index_pages_rendered[str(tmp_path / "org-one/index.html")]
+    second = spy_renderer.index_pages_rendered[
+        str(tmp_path / "org-one/page/2/index.html")
+    ]
+    assert first["breadcrumb"] == [
+        {"href": "../", "text": "Dataset Name"},
+        {"text": "org-one"},
+    ]
+    assert second["breadcrumb"] == [
+        {"href": "../../../", "text": "Dataset Name"},
+        {"text": "org-one"},
+    ]
+    assert [item["href"] for item in second["items"]] == ["../../REF-04"]
+
+
+def test_render_paginated_root_index(dataset_simple_slug_reader):
+    spy_renderer = SpyRenderer()
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field=None,
+        renderer=spy_renderer,
+        index_page_size=3,
+    ).render(dataset_simple_slug_reader)
+
+    first = spy_renderer.index_pages_rendered["docs/index.html"]
+    second = spy_renderer.index_pages_rendered["docs/page/2/index.html"]
+    assert [item["href"] for item in first["items"]] == [
+        "./REF01",
+        "./REF02",
+        "./REF03",
+    ]
+    assert [item["href"] for item in second["items"]] == ["../../REF-04"]
+    assert first["count"] == second["count"] == 4
+    assert first["pagination"] == {
+        "page": 1,
+        "pages": 2,
+        "next": {"href": "./page/2/", "label": "2 of 2"},
+    }
+    assert second["pagination"] == {
+        "page": 2,
+        "pages": 2,
+        "previous": {"href": "../../", "label": "1 of 2"},
+    }
+
+
+@pytest.mark.parametrize("index_store", [None, True])
+def test_render_paginated_groups(dataset_multi_slug_reader, index_store):
+    spy_renderer = SpyRenderer()
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        group_field="organisation",
+        renderer=spy_renderer,
+        index_page_size=2,
+        index_store=index_store,
+    ).render(dataset_multi_slug_reader)
+
+    pages = [
+        {
+            group: [item["reference"] for item in value["items"]]
+            for group, value in spy_renderer.index_pages_rendered[path][
+                "groups"
+            ].items()
+        }
+        for path in ["docs/index.html", "docs/page/2/index.html"]
+    ]
+    assert pages == [
+        {"org-one": ["REF01", "REF03"]},
+        {"org-one": ["REF/04"], "org-two": ["REF02"]},
+    ]
+    assert "docs/page/3/index.html" not in spy_renderer.index_pages_rendered
+    # with the counts of all the groups, and of all the items of each group
+    second = spy_renderer.index_pages_rendered["docs/page/2/index.html"]
+    assert second["group_count"] == 2
+    assert {group: value["count"] for group, value in second["groups"].items()} == {
+        "org-one": 3,
+        "org-two": 1,
+    }
+    assert "pagination" in spy_renderer.index_pages_rendered["docs/org-one/index.html"]
+
+
+def test_paginate_groups_reads_a_page_at_a_time():
+    read = []
+
+    class Items:
+        def __init__(self, references):
+            self.references = references
+
+        def __len__(self):
+            return len(self.references)
+
+        def __iter__(self):
+            for reference in self.references:
+                read.append(reference)
+                yield reference
+
+    groups = OrderedDict(
+        [
+            ("one", {"text": "one", "items": Items(["REF1", "REF2", "REF3"])}),
+            ("two", {"text": "two", "items": Items(["REF4"])}),
+        ]
+    )
+    pages = paginate_groups(groups, 2)
+
+    assert next(pages) == {
+        "one": {"text": "one", "items": ["REF1", "REF2"], "count": 3}
+    }
+    assert read == ["REF1", "REF2"]
+    assert list(pages) == [
+        {
+            "one": {"text": "one", "items": ["REF3"], "count": 3},
+            "two": {"text": "two", "items": ["REF4"], "count": 1},
+        }
+    ]
+
+
+def test_render_search_index(dataset_multi_slug_reader, tmp_path):
+    spy_renderer = SpyRenderer()
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        docs=tmp_path,
+        renderer=spy_renderer,
+        search_index=True,
+    ).render(dataset_multi_slug_reader)
+
+    index = json.loads((tmp_path / "search" / "index.json").read_text())
+    assert index["fields"] == ["reference", "name", "organisation", "href"]
+    entries = {
+        tuple(entry)
+        for prefix in index["shards"]
+        for entry in json.loads((tmp_path / "search" / f"{prefix}.json").read_text())
+    }
+    assert ("REF02", "item-two", "org-two", "/dataset-name/org-two/REF02") in entries
+    assert len(entries) == 4
+    assert (
+        spy_renderer.index_pages_rendered[str(tmp_path / "index.html")][
+            "search_index_url"
+        ]
+        == "./search/index.json"
+    )
+
+
+def test_render_sitemap(dataset_multi_slug_reader, tmp_path):
+    Renderer(
+        "dataset-name",
+        "schema-name",
+        "typology-name",
+        "dataset-name",
+        None,
+        SPECIFICATION,
+        docs=tmp_path,
+        renderer=SpyRenderer(),
+        sitemap_url="https://example.com",
+        index_page_size=2,
+    ).render(dataset_multi_slug_reader)
+
+    content = (tmp_path / "sitemap-1.xml").read_text()
+    assert sorted(
+        re.findall("<loc>https://example.com/dataset-name/(.*?)</loc>", content)
+    ) == [
+        "",
+        "org-one/",
+        "org-one/REF-04/",
+        "org-one/REF01/",
+        "org-one/REF03/",
+        "org-one/page/2/",
+        "org-two/",
+        "org-two/REF02/",
+        "page/2/",
+    ]
+
+
+def test_render_gzip_sitemap_compressed(dataset_multi_slug_reader, tmp_path):
+    def render():
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            docs=tmp_path,
+            renderer=SpyRenderer(),
+            incremental=True,
+            sitemap_url="https://example.com",
+            sitemap_gzip=True,
+            compress=["gz"],
+        ).render(dataset_multi_slug_reader)
+
+    render()
+    sitemap = tmp_path / "sitemap-1.xml.gz"
+    assert b"<urlset" in gzip.decompress(sitemap.read_bytes())
+    assert not (tmp_path / "sitemap-1.xml.gz.gz").exists()
+
+    # an unchanged sitemap isn't written again
+    sitemap.write_bytes(b"not written")
+    render()
+    assert sitemap.read_bytes() == b"not written"
+
+
+@pytest.mark.parametrize("index_page_size", [None, 2])
+def test_render_index_store(dataset_multi_slug_reader, tmp_path, index_page_size):
+    renderers = {}
+    for index_store in [None, True]:
+        renderers[index_store] = SpyRenderer()
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field="organisation",
+            docs=tmp_path,
+            renderer=renderers[index_store],
+            index_page_size=index_page_size,
+            index_store=index_store,
+        ).render(dataset_multi_slug_reader)
+
+    assert renderers[True].index_pages_rendered == renderers[None].index_pages_rendered
+
+
+def test_render_resume_from_checkpoint(dataset_multi_slug_reader, tmp_path):
+    def renderer(docs, spy_renderer, **kwargs):
+        return Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field="organisation",
+            docs=tmp_path / docs,
+            renderer=spy_renderer,
+            search_index=True,
+            **kwargs,
+        )
+
+    def interrupted(reader):
+        yield from reader[:3]
+        raise MemoryError()
+
+    with pytest.raises(MemoryError):
+        renderer("docs", SpyRenderer(), checkpoint_interval=1e-9).render(
+            interrupted(dataset_multi_slug_reader)
+        )
+    assert (tmp_path / "docs" / Renderer.checkpoint_filename).exists()
+
+    resumed = SpyRenderer()
+    renderer("docs", resumed, resume=True).render(dataset_multi_slug_reader)
+    expected = SpyRenderer()
+    renderer("expected", expected).render(dataset_multi_slug_reader)
+
+    # entities before the checkpoint aren't rendered again
+    assert len(resumed.row_pages_rendered) == 2
+    assert {
+        os.path.relpath(path, tmp_path / "docs"): kwargs
+        for path, kwargs in resumed.index_pages_rendered.items()
+    } == {
+        os.path.relpath(path, tmp_path / "expected"): kwargs
+        for path, kwargs in expected.index_pages_rendered.items()
+    }
+    assert (tmp_path / "docs" / "search" / "index.json").read_text() == (
+        tmp_path / "expected" / "search" / "index.json"
+    ).read_text()
+    assert not (tmp_path / "docs" / Renderer.checkpoint_filename).exists()
+
+
+@pytest.mark.parametrize("index_store", [None, True])
+def test_render_shards(dataset_multi_slug_reader, tmp_path, index_store):
+    def renderer(spy_renderer, **kwargs):
+        return Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            group_field="organisation",
+            docs=tmp_path,
+            renderer=spy_renderer,
+            index_store=index_store,
+            **kwargs,
+        )
+
+    expected = SpyRenderer()
+    renderer(expected).render(dataset_multi_slug_reader)
+
+    rendered = {}
+    for number in [1, 2]:
+        shard = SpyRenderer()
+        renderer(shard, shard=(number, 2)).render(dataset_multi_slug_reader)
+        assert shard.index_pages_rendered == {}
+        rendered.update(shard.row_pages_rendered)
+    merged = SpyRenderer()
+    renderer(merged).merge_shards(2)
+
+    assert rendered.keys() == expected.row_pages_rendered.keys()
+    assert merged.row_pages_rendered == {}
+    assert merged.index_pages_rendered == expected.index_pages_rendered
+
+
+def create_dataset(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE entry (id INTEGER PRIMARY KEY, slug TEXT, data TEXT, resource TEXT, line_num INTEGER)"
+    )
+    for idx, row in enumerate(rows):
+        conn.execute(
+            "INSERT INTO entry (slug, data, resource, line_num) VALUES (?, ?, ?, ?)",
+            (row["slug"], json.dumps(row), "abc123", idx),
+        )
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.mark.parametrize("index_store", [None, "index.sqlite3"])
+def test_render_dataset_diff(_dataset_reader, templates_dir, index_store):
+    (templates_dir / "templates" / "index.html").write_text(
+        "{{ count }}{% for item in items %} {{ item.href }}{% endfor %}"
+        "{% for group in (groups or {}).values() %} {{ group.text }}:"
+        "{% for item in group['items'] %} {{ item.href }}{% endfor %}{% endfor %}"
+    )
+    rows = [
+        dict(
+            row,
+            slug=f"/dataset-name/{row['organisation']}/{row['dataset-name'].replace('/', '-')}",
+        )
+        for row in _dataset_reader
+    ]
+    previous_path = create_dataset(templates_dir / "previous.sqlite3", rows)
+
+    # REF01 is changed, REF02 and so all of org-two removed, and REF05 added
+    changed_rows = [dict(row) for row in rows if row["dataset-name"] != "REF02"]
+    changed_rows[0]["name"] = "item-1"
+    changed_rows.append(
+        dict(
+            rows[0],
+            **{"dataset-name": "REF05", "name": "item-five", "organisation": "org-3"},
+            slug="/dataset-name/org-3/REF05",
+        )
+    )
+    dataset_path = create_dataset(templates_dir / "dataset.sqlite3", changed_rows)
+
+    def renderer(docs, index_store=None):
+        return Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            docs=templates_dir / docs,
+            incremental=True,
+            index_store=index_store and templates_dir / index_store,
+        )
+
+    docs = templates_dir / "docs"
+    renderer("docs", index_store).render_dataset(previous_path)
+    (docs / "org-one" / "REF03" / "index.html").write_text("not rendered")
+    renderer("docs", index_store).render_dataset_diff(previous_path, dataset_path)
+    renderer("expected").render_dataset(dataset_path)
+
+    # only the changed entities are rendered
+    assert (docs / "org-one" / "REF03" / "index.html").read_text() == "not rendered"
+    (docs / "org-one" / "REF03" / "index.html").write_text("item-three")
+
+    def pages(docs):
+        return {
+            str(path.relative_to(docs)): path.read_text()
+            for path in docs.rglob("*")
+            if path.is_file() and not path.name.startswith(".")
+        }
+
+    assert pages(docs) == pages(templates_dir / "expected")
+    assert (docs / "org-3" / "REF05" / "index.html").read_text() == "item-five"
+    assert not (docs / "org-two").exists()
+
+
+def test_render_dataset_rows(_dataset_reader, templates_dir):
+    rows = [
+        dict(row, slug=f"/dataset-name/{row['dataset-name'].replace('/', '-')}")
+        for row in _dataset_reader
+    ]
+    create_dataset(templates_dir / "dataset.sqlite3", rows)
+    with open(templates_dir / "dataset.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for name in ["dataset.sqlite3", "dataset.csv"]:
+        Renderer(
+            "dataset-name",
+            "schema-name",
+            "typology-name",
+            "dataset-name",
+            None,
+            SPECIFICATION,
+            docs=templates_dir / f"docs-{name}",
+        ).render_dataset(templates_dir / name)
+
+    # rows read from a flattened dataset render the same pages
+    pages = sorted((templates_dir / "docs-dataset.sqlite3").rglob("index.html"))
+    assert len(pages) == 5
+    for page in pages:
+        relative_path = page.relative_to(templates_dir / "docs-dataset.sqlite3")
+        assert (templates_dir / "docs-dataset.csv" / relative_path).read_text() == (
+            page.read_text()
+        )
+
+
 def test_slug_to_relative_href():
     slug = "local-authority-eng/BUC/avdlp-GP2"
 
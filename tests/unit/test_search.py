@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from digital_land_frontend.search import SearchIndex, tokens
+from digital_land_frontend.writers import FileWriter
+
+
+def test_tokens():
+    assert tokens("Conservation Area (North) 2") == [
+        "conservation",
+        "area",
+        "north",
+        "2",
+    ]
+    assert tokens(None) == []
+
+
+def test_search_index_splits_large_shards(tmp_path):
+    search_index = SearchIndex(tmp_path)
+    search_index.shard_size = 2
+    for reference, name in [
+        ("CA1", "Abbey Road"),
+        ("CA2", "Abbots Langley"),
+        ("CA3", "Acton"),
+        ("CA4", "Barnet"),
+    ]:
+        search_index.add(reference, name, "org", f"/ca/{reference}")
+
+    shards = dict(search_index.shards())
+    assert shards["b"] == [3]
+    assert shards["ab"] == [0, 1]
+    assert shards["ac"] == [2]
+    # ca1, ca2, ... are split down to one shard per reference
+    assert shards["ca1"] == [0]
+
+    assert search_index.finish(FileWriter(), None) == "search/index.json"
+    assert Path(tmp_path / "search" / "ab.json").read_text() == (
+        '[["CA1","Abbey Road","org","/ca/CA1"],["CA2","Abbots Langley","org","/ca/CA2"]]'
+    )
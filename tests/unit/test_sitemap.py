@@ -0,0 +1,42 @@
+import gzip
+import re
+
+from digital_land_frontend.sitemap import Sitemap
+from digital_land_frontend.writers import FileWriter
+
+
+def locations(content):
+    return re.findall("<loc>(.*?)</loc>", content)
+
+
+def test_sitemap_rotates_files(tmp_path):
+    sitemap = Sitemap(tmp_path, "https://example.com/", "/dataset/")
+    sitemap.max_urls = 2
+    writer = FileWriter()
+    for path in ["", "REF01", "org/REF&02"]:
+        sitemap.add(path, writer)
+    sitemap.finish(writer)
+
+    assert locations((tmp_path / "sitemap-1.xml").read_text()) == [
+        "https://example.com/dataset/",
+        "https://example.com/dataset/REF01/",
+    ]
+    assert locations((tmp_path / "sitemap-2.xml").read_text()) == [
+        "https://example.com/dataset/org/REF&amp;02/"
+    ]
+    assert locations((tmp_path / "sitemap.xml").read_text()) == [
+        "https://example.com/dataset/sitemap-1.xml",
+        "https://example.com/dataset/sitemap-2.xml",
+    ]
+
+
+def test_sitemap_gzip(tmp_path):
+    sitemap = Sitemap(tmp_path, "https://example.com", "/dataset/", compress=True)
+    sitemap.add("REF01", FileWriter())
+    sitemap.finish(FileWriter())
+
+    content = gzip.decompress((tmp_path / "sitemap-1.xml.gz").read_bytes()).decode()
+    assert locations(content) == ["https://example.com/dataset/REF01/"]
+    assert locations((tmp_path / "sitemap.xml").read_text()) == [
+        "https://example.com/dataset/sitemap-1.xml.gz"
+    ]
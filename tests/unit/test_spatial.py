@@ -0,0 +1,17 @@
+from digital_land_frontend.spatial import hilbert_index
+
+
+def test_hilbert_index():
+    # order 1 curve visits the four quadrants in a U
+    assert [
+        hilbert_index(x, y, order=1) for x, y in [(0, 0), (0, 1), (1, 1), (1, 0)]
+    ] == [
+        0,
+        1,
+        2,
+        3,
+    ]
+    # every cell of an order 3 grid gets a distinct position on the curve
+    assert sorted(
+        hilbert_index(x, y, order=3) for x in range(8) for y in range(8)
+    ) == list(range(64))
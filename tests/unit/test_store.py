@@ -0,0 +1,115 @@
+import pytest
+
+from digital_land_frontend.index import IndexEntry, SlugTrie, natural_sort_key
+from digital_land_frontend.store import IndexStore, encode_sort_key
+
+
+def test_encode_sort_key():
+    references = ["REF10", "REF2", "REF02", "REF", "ref1", "REF2a", "2", "10", "A1B2"]
+
+    assert sorted(references, key=encode_sort_key) == sorted(
+        references, key=natural_sort_key
+    )
+
+
+@pytest.fixture()
+def store(tmp_path):
+    store = IndexStore(tmp_path / "index.sqlite3")
+    yield store
+    store.close()
+
+
+def test_stored_slug_trie(store):
+    tries = [SlugTrie(), store.trie()]
+    for trie in tries:
+        for path, reference in [
+            ("org-one/area/REF01", "REF01"),
+            ("org-one/area/REF02", "REF02"),
+            ("org-one/area/REF01", "REF01"),
+            ("org-one/REF03", "REF03"),
+            ("org-two/area/REF04", "REF04"),
+        ]:
+            trie.add(
+                path, reference, IndexEntry(reference, None, href=f"./{reference}")
+            )
+
+    def pages(trie):
+        return [
+            (
+                path,
+                [entry.state() for entry in node.entries.values()],
+                node.directories(),
+            )
+            for path, node in trie.walk()
+        ]
+
+    assert pages(tries[1]) == pages(tries[0])
+    assert tries[1].find("org-three") is None
+    for trie in tries:
+        assert trie.remove("org-two/area/REF04", "REF04")
+    assert pages(tries[1]) == pages(tries[0])
+
+
+def test_stored_page_items(store):
+    tries = [SlugTrie(), store.trie()]
+    for trie in tries:
+        for reference in ["REF10", "REF2", "REF02", "REF1"]:
+            trie.add(
+                f"org-one/{reference}",
+                reference,
+                IndexEntry(reference, None, href=f"./{reference}"),
+            )
+
+    def items(trie):
+        page = trie.find("org-one")
+        return page.items(
+            IndexEntry(reference, None, href=f"./{reference}")
+            for reference in ["REF3", "REF2"]
+        )
+
+    # read in order from the store, with the extra entries merged in
+    assert len(items(tries[1])) == 6
+    assert [entry.state() for entry in items(tries[1])] == [
+        entry.state() for entry in items(tries[0])
+    ]
+    assert [entry.reference for entry in items(tries[1])] == [
+        "REF1",
+        "REF2",
+        "REF02",
+        "REF2",
+        "REF3",
+        "REF10",
+    ]
+
+
+def test_stored_index_items(store):
+    items = store.items()
+    for reference in ["REF10", "REF2", "REF1"]:
+        items.append(IndexEntry(reference, None, slug=f"/dataset/{reference}"))
+
+    assert len(items) == 3
+    assert [entry.reference for entry in items] == ["REF1", "REF2", "REF10"]
+
+    items.remove({"/dataset/REF2"})
+    assert [entry.reference for entry in items] == ["REF1", "REF10"]
+
+    groups = {"org-one": {"text": "Org one", "items": items}}
+    store.save_groups(groups)
+    store.commit()
+    restored = IndexStore(store.path).load_groups()
+    assert [entry.reference for entry in restored["org-one"]["items"]] == [
+        "REF1",
+        "REF10",
+    ]
+
+
+def test_stored_set(store):
+    seen = store.set("seen")
+    seen.add(("org-one", "/dataset/REF1"))
+    seen.add(("org-one", "/dataset/REF1"))
+
+    assert ("org-one", "/dataset/REF1") in seen
+    assert len(seen) == 1
+
+    seen.discard(("org-one", "/dataset/REF1"))
+    assert ("org-one", "/dataset/REF1") not in seen
@@ -0,0 +1,75 @@
+import gzip
+import threading
+
+import pytest
+
+from digital_land_frontend.writers import (
+    CompressingWriter,
+    FileWriter,
+    ThreadedWriter,
+)
+
+
+class SlowWriter(FileWriter):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, path, content):
+        self.release.wait(5)
+        super().write(path, content)
+
+
+def test_file_writer_creates_directories(tmp_path):
+    writer = FileWriter()
+    writer.write(tmp_path / "a" / "b" / "index.html", "text")
+    writer.write(tmp_path / "a" / "b" / "geometry.geojson", b"bytes")
+
+    assert (tmp_path / "a" / "b" / "index.html").read_text() == "text"
+    assert (tmp_path / "a" / "b" / "geometry.geojson").read_bytes() == b"bytes"
+    assert writer.directories == {str(tmp_path / "a" / "b")}
+
+
+def test_threaded_writer_flush_waits_for_writes(tmp_path):
+    slow_writer = SlowWriter()
+    writer = ThreadedWriter(slow_writer, max_workers=2)
+    for n in range(10):
+        writer.write(tmp_path / str(n) / "index.html", str(n))
+
+    assert not (tmp_path / "9" / "index.html").exists()
+    slow_writer.release.set()
+    writer.flush()
+
+    for n in range(10):
+        assert (tmp_path / str(n) / "index.html").read_text() == str(n)
+    writer.close()
+
+
+def test_threaded_writer_flush_raises_write_errors(tmp_path):
+    (tmp_path / "file").write_text("not a directory")
+    writer = ThreadedWriter()
+    writer.write(tmp_path / "file" / "index.html", "text")
+
+    with pytest.raises(OSError):
+        writer.flush()
+    writer.close()
+
+
+def test_compressing_writer(tmp_path):
+    writer = CompressingWriter(formats=["gz"])
+    writer.write(tmp_path / "index.html", "text")
+    writer.write_stream(tmp_path / "stream.html", iter(["streamed ", "text"]))
+
+    assert (tmp_path / "index.html").read_text() == "text"
+    assert gzip.decompress((tmp_path / "index.html.gz").read_bytes()) == b"text"
+    assert (tmp_path / "stream.html").read_text() == "streamed text"
+    assert (
+        gzip.decompress((tmp_path / "stream.html.gz").read_bytes()) == b"streamed text"
+    )
+
+    # files already compressed aren't compressed again
+    writer.write(tmp_path / "sitemap.xml.gz", gzip.compress(b"sitemap"))
+    assert not (tmp_path / "sitemap.xml.gz.gz").exists()
+
+    with pytest.raises(ValueError):
+        CompressingWriter(formats=["zip"])